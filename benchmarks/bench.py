@@ -0,0 +1,334 @@
+"""Benchmarks of API and page endpoints on large seeded databases.
+
+Usage (from project root directory):
+
+    python benchmarks/bench.py --sizes 10000 100000 1000000
+    python benchmarks/bench.py --output new.json --baseline baseline.json
+
+Recipes are seeded into a separate database with a fixed random seed,
+growing it to every size in turn, and endpoints are driven in-process
+through the ASGI app. Latency percentiles, throughput, SQL queries per
+request and peak RSS are written to a JSON file. With `--baseline`,
+results are compared to a previous file and the exit code is 1 if any
+scenario got slower than `--tolerance` allows or makes more queries.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import sqlite3
+import sys
+from datetime import datetime
+from pathlib import Path
+from statistics import mean, quantiles
+from time import perf_counter
+from typing import Any, Awaitable, Callable
+
+ROOT = Path(__file__).resolve().parent.parent
+DATA_DIR = ROOT / "benchmarks" / "data"
+
+# The app reads its configuration on import
+DATA_DIR.mkdir(exist_ok=True)
+DATABASE_PATH = DATA_DIR / "bench.db"
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{DATABASE_PATH}")
+os.environ.setdefault("SECRET_KEYS", "benchmark-secret-key")
+os.environ.setdefault(
+    "RATELIMIT_STORAGE_URI", f"sqlite:///{DATA_DIR / 'ratelimit.db'}"
+)
+sys.path[:0] = [str(ROOT / "src"), str(ROOT)]
+
+from httpx import AsyncClient
+from sqlalchemy import event, func, select
+from sqlalchemy.engine import Engine
+
+from cache import recipes_version
+from config import limiter
+from database import Base, Recipe, User, async_session_maker, engine
+from main import app
+from recipes.generate import WORDS, generate_recipes, generate_users
+from recipes.sampling import recipe_ids
+from recipes.utils import encode_cursor
+
+BASE_URL = "https://bench"
+
+Scenario = Callable[[AsyncClient, random.Random], Awaitable[Any]]
+
+
+def words(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+async def count_rows(model: type[Base]) -> int:
+    async with async_session_maker() as session:
+        return await session.scalar(select(func.count()).select_from(model))
+
+
+async def seed(rng: random.Random, size: int, batch_size: int) -> float:
+    """Grows the database to `size` recipes and `size / 100` users.
+
+    Returns seconds spent on it."""
+    started_at = perf_counter()
+    users = await count_rows(User)
+    recipes = await count_rows(Recipe)
+    async with engine.begin() as conn:
+        await generate_users(
+            conn, max(max(size // 100, 10) - users, 0), prefix="bench",
+            batch_size=batch_size
+        )
+        await generate_recipes(
+            conn, rng, size - recipes, batch_size=batch_size
+        )
+
+    # Other workers' writes are picked up by TTLs, the bench doesn't wait
+    recipes_version.bump()
+    async with async_session_maker() as session:
+        await recipe_ids.load(session)
+
+    return perf_counter() - started_at
+
+
+async def deep_cursor(size: int) -> str:
+    """Returns a cursor of the latest recipes at 90% of the list."""
+    async with async_session_maker() as session:
+        row = (await session.execute(
+            select(Recipe.pub_date, Recipe.id).order_by(
+                Recipe.pub_date.desc(), Recipe.id.desc()
+            ).offset(size * 9 // 10).limit(1)
+        )).one()
+
+    return encode_cursor(row.pub_date, row.id)
+
+
+def read_scenarios(size: int, cursor: str) -> dict[str, Scenario]:
+    deep_page = max(size * 9 // 10 // 12, 1)
+
+    return {
+        "latest": lambda c, rng: c.get("/api/recipes/"),
+        "deep_page_offset": lambda c, rng: c.get(
+            "/api/recipes/", params={"page": deep_page}
+        ),
+        "deep_page_cursor": lambda c, rng: c.get(
+            "/api/recipes/", params={"cursor": cursor}
+        ),
+        "search": lambda c, rng: c.get(
+            "/api/recipes/", params={"search_query": words(rng, 2)}
+        ),
+        "by_id": lambda c, rng: c.get(
+            "/api/recipes/", params={"id": rng.randrange(1, size + 1)}
+        ),
+        "random": lambda c, rng: c.get("/api/recipes/random"),
+        "index_page": lambda c, rng: c.get(
+            "/", params={"page": rng.randrange(1, 100)}
+        ),
+        "recipe_page": lambda c, rng: c.get(
+            f"/recipe/{rng.randrange(1, size + 1)}/"
+        ),
+    }
+
+
+def write_scenarios(created: list[int]) -> dict[str, Scenario]:
+    async def create(c: AsyncClient, rng: random.Random) -> Any:
+        r = await c.post("/api/recipes/", json={
+            "headling": words(rng, 4)[:50].ljust(10, "!"),
+            "text": words(rng, 50),
+        })
+        created.append(r.json()["id"])
+        return r
+
+    updated = iter(created)
+    deleted = iter(created)
+
+    return {
+        "create": create,
+        "update": lambda c, rng: c.put(
+            "/api/recipes/", params={"id": next(updated)}, json={
+                "headling": words(rng, 4)[:50].ljust(10, "!"),
+                "text": words(rng, 50),
+            }
+        ),
+        "delete": lambda c, rng: c.delete(
+            "/api/recipes/", params={"id": next(deleted)}
+        ),
+    }
+
+
+async def run_scenario(
+    client: AsyncClient, scenario: Scenario, rng: random.Random,
+    requests: int, warmup: int
+) -> dict[str, float]:
+    """Sends requests one by one, returns latency and queries stats."""
+    for _ in range(warmup):
+        await scenario(client, rng)
+
+    queries = 0
+
+    def count_query(*args) -> None:
+        nonlocal queries
+        queries += 1
+
+    latencies, errors = [], 0
+    event.listen(Engine, "before_cursor_execute", count_query)
+    started_at = perf_counter()
+    try:
+        for _ in range(requests):
+            request_started_at = perf_counter()
+            r = await scenario(client, rng)
+            latencies.append(perf_counter() - request_started_at)
+            errors += r.status_code >= 400
+    finally:
+        elapsed = perf_counter() - started_at
+        event.remove(Engine, "before_cursor_execute", count_query)
+
+    percentiles = quantiles(latencies, n=100, method="inclusive")
+
+    return {
+        "p50_ms": percentiles[49] * 1000,
+        "p95_ms": percentiles[94] * 1000,
+        "p99_ms": percentiles[98] * 1000,
+        "mean_ms": mean(latencies) * 1000,
+        "rps": requests / elapsed,
+        "queries_per_request": queries / requests,
+        "errors": errors,
+    }
+
+
+def peak_rss_mb() -> float:
+    # Kilobytes on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+async def authenticate(client: AsyncClient) -> None:
+    credentials = {"email": "bench@example.com", "password": "bench1234"}
+    await client.post("/auth/register", json={
+        "username": "bench_writer", **credentials
+    })
+    # Auth cookie is secure, so clients use https base URL to send it
+    r = await client.post("/auth/jwt/login", data={
+        "username": credentials["email"], "password": credentials["password"]
+    })
+    r.raise_for_status()
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    if not args.keep_db:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+
+    limiter.enabled = False
+    rng = random.Random(args.seed)
+    results = {
+        "meta": {
+            "date": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "seed": args.seed, "requests": args.requests,
+        },
+        "sizes": {},
+    }
+
+    for size in sorted(args.sizes):
+        if await count_rows(Recipe) > size:
+            sys.exit(f"Database has more than {size} recipes, drop --keep-db")
+
+        print(f"Seeding {size} recipes", file=sys.stderr)
+        seed_seconds = await seed(rng, size, args.batch_size)
+        scenarios = read_scenarios(size, await deep_cursor(size))
+
+        size_results = {"seed_seconds": seed_seconds, "scenarios": {}}
+        async with AsyncClient(app=app, base_url=BASE_URL) as anonymous:
+            for name, scenario in scenarios.items():
+                print(f"  {size}: {name}", file=sys.stderr)
+                size_results["scenarios"][name] = await run_scenario(
+                    anonymous, scenario, rng, args.requests, args.warmup
+                )
+
+        async with AsyncClient(app=app, base_url=BASE_URL) as writer:
+            await authenticate(writer)
+            # Updates and deletes use recipes made by creates
+            created = []
+            for name, scenario in write_scenarios(created).items():
+                print(f"  {size}: {name}", file=sys.stderr)
+                size_results["scenarios"][name] = await run_scenario(
+                    writer, scenario, rng, args.requests, warmup=0
+                )
+
+        size_results["peak_rss_mb"] = peak_rss_mb()
+        results["sizes"][str(size)] = size_results
+
+    return results
+
+
+def compare(
+    results: dict[str, Any], baseline: dict[str, Any], tolerance: float
+) -> list[str]:
+    """Prints results next to the baseline, returns found regressions."""
+    regressions = []
+    print(f"{'size':>8} {'scenario':<18} {'p95 ms':>9} {'baseline':>9} "
+          f"{'change':>8} {'queries':>8}")
+    for size, size_results in results["sizes"].items():
+        base_scenarios = baseline["sizes"].get(size, {}).get("scenarios", {})
+        for name, stats in size_results["scenarios"].items():
+            base = base_scenarios.get(name)
+            if base is None:
+                continue
+
+            change = stats["p95_ms"] / base["p95_ms"] - 1
+            print(f"{size:>8} {name:<18} {stats['p95_ms']:>9.2f} "
+                  f"{base['p95_ms']:>9.2f} {change:>+8.0%} "
+                  f"{stats['queries_per_request']:>8.1f}")
+
+            if change > tolerance:
+                regressions.append(f"{size} {name}: p95 {change:+.0%}")
+            if stats["queries_per_request"] > base["queries_per_request"]:
+                regressions.append(
+                    f"{size} {name}: {stats['queries_per_request']:.1f} "
+                    f"queries per request instead of "
+                    f"{base['queries_per_request']:.1f}"
+                )
+
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=20_000)
+    parser.add_argument(
+        "--keep-db", action="store_true",
+        help="grow the database left by a previous run instead of reseeding"
+    )
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="results of a previous run")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2,
+        help="allowed p95 slowdown against the baseline, 0.2 is 20%%"
+    )
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results are written to {args.output}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""added recipe full-text search index
+
+Revision ID: 3f1c9b7d2e84
+Revises: a6435c4bb609
+Create Date: 2026-10-17 12:04:11.218406
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c9b7d2e84'
+down_revision: Union[str, None] = 'a6435c4bb609'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE VIRTUAL TABLE recipe_fts USING fts5(
+            headling, text, content='recipe', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+    op.execute("""
+        CREATE TRIGGER recipe_fts_insert AFTER INSERT ON recipe BEGIN
+            INSERT INTO recipe_fts(rowid, headling, text)
+            VALUES (new.id, new.headling, new.text);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER recipe_fts_delete AFTER DELETE ON recipe BEGIN
+            INSERT INTO recipe_fts(recipe_fts, rowid, headling, text)
+            VALUES ('delete', old.id, old.headling, old.text);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER recipe_fts_update AFTER UPDATE OF headling, text
+        ON recipe BEGIN
+            INSERT INTO recipe_fts(recipe_fts, rowid, headling, text)
+            VALUES ('delete', old.id, old.headling, old.text);
+            INSERT INTO recipe_fts(rowid, headling, text)
+            VALUES (new.id, new.headling, new.text);
+        END
+    """)
+    # Indexing already existing recipes
+    op.execute("INSERT INTO recipe_fts(recipe_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER recipe_fts_update")
+    op.execute("DROP TRIGGER recipe_fts_delete")
+    op.execute("DROP TRIGGER recipe_fts_insert")
+    op.execute("DROP TABLE recipe_fts")
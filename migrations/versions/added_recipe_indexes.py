@@ -0,0 +1,35 @@
+"""added recipe listing indexes
+
+Revision ID: c47d1a9e5b32
+Revises: 9b2e4c61d0f7
+Create Date: 2026-10-17 18:02:26.417935
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c47d1a9e5b32'
+down_revision: Union[str, None] = '9b2e4c61d0f7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_recipe_pub_date_id', 'recipe',
+        [sa.text('pub_date DESC'), sa.text('id DESC')]
+    )
+    op.create_index(
+        'ix_recipe_author_id_pub_date', 'recipe', ['author_id', 'pub_date']
+    )
+    # Gathering statistics for the query planner
+    op.execute("ANALYZE")
+
+
+def downgrade() -> None:
+    op.drop_index('ix_recipe_author_id_pub_date', table_name='recipe')
+    op.drop_index('ix_recipe_pub_date_id', table_name='recipe')
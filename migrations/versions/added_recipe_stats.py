@@ -0,0 +1,48 @@
+"""added recipe stats table
+
+Revision ID: 5e8a2f0c7b19
+Revises: c47d1a9e5b32
+Create Date: 2026-10-17 18:41:09.532871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e8a2f0c7b19'
+down_revision: Union[str, None] = 'c47d1a9e5b32'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE recipe_stats (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            recipe_count INTEGER NOT NULL
+        )
+    """)
+    # Counting already existing recipes
+    op.execute("""
+        INSERT INTO recipe_stats (id, recipe_count)
+        VALUES (1, (SELECT count(*) FROM recipe))
+    """)
+    op.execute("""
+        CREATE TRIGGER recipe_stats_insert AFTER INSERT ON recipe BEGIN
+            UPDATE recipe_stats SET recipe_count = recipe_count + 1;
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER recipe_stats_delete AFTER DELETE ON recipe BEGIN
+            UPDATE recipe_stats SET recipe_count = recipe_count - 1;
+        END
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER recipe_stats_delete")
+    op.execute("DROP TRIGGER recipe_stats_insert")
+    op.execute("DROP TABLE recipe_stats")
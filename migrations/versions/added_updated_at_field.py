@@ -0,0 +1,27 @@
+"""added updated_at field
+
+Revision ID: 9b2e4c61d0f7
+Revises: 3f1c9b7d2e84
+Create Date: 2026-10-17 14:37:52.640193
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b2e4c61d0f7'
+down_revision: Union[str, None] = '3f1c9b7d2e84'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('recipe', sa.Column('updated_at', sa.TIMESTAMP(), nullable=True))
+    op.execute("UPDATE recipe SET updated_at = pub_date")
+
+
+def downgrade() -> None:
+    op.drop_column('recipe', 'updated_at')
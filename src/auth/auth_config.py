@@ -1,17 +1,62 @@
+from time import time
+
+import jwt
+from fastapi import Request
+from fastapi_users import BaseUserManager, FastAPIUsers, exceptions
 from fastapi_users.authentication import (
     CookieTransport, JWTStrategy, AuthenticationBackend
 )
-from fastapi_users import FastAPIUsers
+from fastapi_users_db_sqlalchemy import SQLAlchemyUserDatabase
 
-from auth.manager import get_user_manager
-from database import User
-from config import SECRET
+from auth.manager import UserManager, get_user_manager
+from auth.schemas import Principal
+from auth.utils import get_principal, principal_cache
+from cache import MISSING
+from database import User, async_session_maker
+from config import SECRET, SECRET_KEYS
+from signing import decode_token
 
 cookie_transport = CookieTransport(cookie_max_age=3600)
 
 
-def get_jwt_strategy() -> JWTStrategy:
-    return JWTStrategy(secret=SECRET, lifetime_seconds=3600)
+class PrincipalJWTStrategy(JWTStrategy[User, int]):
+    """JWT strategy that resolves a token to `Principal` instead of `User`.
+
+    So authentication doesn't load a whole user with its relationships.
+    Tokens signed by any of `SECRET_KEYS` are accepted. Resolved principals
+    are cached until the token expires, but not longer than
+    `PRINCIPAL_CACHE_TTL`."""
+
+    async def read_token(
+        self, token: str | None, user_manager: BaseUserManager[User, int]
+    ) -> Principal | None:
+        if token is None:
+            return None
+
+        principal = principal_cache.get(token)
+        if principal is not MISSING:
+            return principal
+
+        try:
+            data = decode_token(
+                token, SECRET_KEYS, self.token_audience, [self.algorithm]
+            )
+            id = user_manager.parse_id(data["sub"])
+        except (jwt.PyJWTError, KeyError, exceptions.InvalidID):
+            return None
+
+        # Also caches `None` for tokens of deleted users
+        principal = await get_principal(user_manager.user_db.session, id)
+        principal_cache.set(token, principal, ttl=data["exp"] - time())
+
+        return principal
+
+    async def destroy_token(self, token: str, user: Principal) -> None:
+        principal_cache.pop(token)
+
+
+def get_jwt_strategy() -> PrincipalJWTStrategy:
+    return PrincipalJWTStrategy(secret=SECRET, lifetime_seconds=3600)
 
 
 auth_backend = AuthenticationBackend(
@@ -27,3 +72,15 @@ fastapi_users = FastAPIUsers[User, int](
 
 current_user = fastapi_users.current_user()
 optional_current_user = fastapi_users.current_user(optional=True)
+current_superuser = fastapi_users.current_user(active=True, superuser=True)
+
+
+async def get_request_principal(request: Request) -> Principal | None:
+    """Authenticates a request outside of routes, e.g. in middlewares."""
+    token = request.cookies.get(cookie_transport.cookie_name)
+    if token is None:
+        return None
+
+    async with async_session_maker() as session:
+        user_manager = UserManager(SQLAlchemyUserDatabase(session, User))
+        return await get_jwt_strategy().read_token(token, user_manager)
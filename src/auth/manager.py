@@ -1,17 +1,34 @@
 from typing import Generator, Any
 
-from fastapi import Depends
+from fastapi import Depends, Request
 from fastapi_users import BaseUserManager, IntegerIDMixin
 
 from database import User
 from config import SECRET
-from auth.utils import get_user_db
+from auth.utils import get_user_db, invalidate_principal
 
 
 class UserManager(IntegerIDMixin, BaseUserManager[User, int]):
     reset_password_token_secret = SECRET
     verification_token_secret = SECRET
 
+    async def on_after_update(
+        self, user: User, update_dict: dict[str, Any],
+        request: Request | None = None
+    ) -> None:
+        # Cached tokens mustn't outlive a changed password or user flags
+        invalidate_principal(user.id)
+
+    async def on_after_reset_password(
+        self, user: User, request: Request | None = None
+    ) -> None:
+        invalidate_principal(user.id)
+
+    async def on_after_delete(
+        self, user: User, request: Request | None = None
+    ) -> None:
+        invalidate_principal(user.id)
+
 
 async def get_user_manager(user_db=Depends(get_user_db)) -> Generator[UserManager, Any, None]:
     yield UserManager(user_db)
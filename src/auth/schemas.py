@@ -1,7 +1,7 @@
 from typing import Optional
 
 from fastapi_users.schemas import BaseUser, BaseUserCreate
-from pydantic import EmailStr
+from pydantic import BaseModel, EmailStr
 
 
 class UserRead(BaseUser[int]):
@@ -22,3 +22,13 @@ class UserCreate(BaseUserCreate):
     is_active: Optional[bool] = True
     is_superuser: Optional[bool] = False
     is_verified: Optional[bool] = False
+
+
+class Principal(BaseModel):
+    """Authenticated user without relationships, that routes depend on."""
+    id: int
+    username: str
+    email: str
+    is_active: bool
+    is_superuser: bool
+    is_verified: bool
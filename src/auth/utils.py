@@ -3,14 +3,20 @@ from typing import Any, Generator
 from email_validator import validate_email, EmailNotValidError
 from fastapi import Depends, Request
 from fastapi.responses import RedirectResponse
+from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.templating import Jinja2Templates
+from fastapi_users import BaseUserManager
+from fastapi_users.authentication import Strategy
 from starlette.templating import _TemplateResponse
 from fastapi_users_db_sqlalchemy import SQLAlchemyUserDatabase
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from config import PROTOCOL, HOST, PORT
+from cache import LRUCache
+from config import PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL
 from database import User, get_async_session
-from base_utils import post, show_errors
+from base_utils import show_errors
+from .schemas import Principal
 
 
 async def get_user_db(
@@ -19,12 +25,37 @@ async def get_user_db(
     yield SQLAlchemyUserDatabase(session, User)
 
 
+# Authenticated users by their tokens
+principal_cache = LRUCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+
+
+def invalidate_principal(id: int) -> None:
+    """Removes all cached tokens of the user with passed id."""
+    principal_cache.evict(
+        lambda token, principal: principal is not None and principal.id == id
+    )
+
+
+async def get_principal(session: AsyncSession, id: int) -> Principal | None:
+    """Loads only those user fields, that are needed by routes."""
+    stmt = select(
+        User.id, User.username, User.email,
+        User.is_active, User.is_superuser, User.is_verified
+    ).where(User.id == id)
+    result = await session.execute(stmt)
+    row = result.first()
+
+    return Principal(**row._mapping) if row else None
+
+
 async def check_email(email: str, errors: list) -> None:
     """Checks passed email and adds errors in `errors` list."""
     if not email:
         errors.append("Email field is required")
     try:
-        validate_email(email)
+        # Syntax only, like `EmailStr` of the API. Deliverability check is
+        # a blocking DNS lookup on the event loop
+        validate_email(email, check_deliverability=False)
     except EmailNotValidError:
         errors.append("The part after the @-sign is not valid. It is not within a valid top-level domain")
 
@@ -49,23 +80,27 @@ async def check_password(password: str, errors: list) -> None:
 
 
 async def _login(
-    request: Request, templates: Jinja2Templates, data: dict,
-    after_register: bool = False
+    request: Request, templates: Jinja2Templates,
+    user_manager: BaseUserManager[User, int], strategy: Strategy[User, int],
+    data: dict
 ) -> _TemplateResponse | RedirectResponse:
     """User login."""
-    logged_user = await post(
-        f"{PROTOCOL}://{HOST}:{PORT}/auth/jwt/login", data=data
+    credentials = OAuth2PasswordRequestForm(
+        username=data["username"], password=data["password"]
     )
+    logged_user = await user_manager.authenticate(credentials)
 
-    if not after_register and isinstance(logged_user, dict):
-        if logged_user.get("detail") == "LOGIN_BAD_CREDENTIALS":
-            errors = ["Invalid credentials"]
-            return show_errors(request, templates, errors, "auth/login.html")
+    if logged_user is None or not logged_user.is_active:
+        errors = ["Invalid credentials"]
+        return show_errors(
+            request, templates, None, errors, "auth/login.html"
+        )
 
     response = RedirectResponse("/", status_code=302)
     response.set_cookie(
         key="fastapiusersauth",
-        value=logged_user.cookies["fastapiusersauth"]
+        value=await strategy.write_token(logged_user)
     )
+    await user_manager.on_after_login(logged_user, request, response)
 
     return response
@@ -1,34 +1,19 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from hashlib import blake2b
 from typing import Any
 
-import httpx
-
-from fastapi import Request
+from fastapi import HTTPException, Request, Response
 from fastapi.templating import Jinja2Templates
+from starlette.status import HTTP_304_NOT_MODIFIED
 from starlette.templating import _TemplateResponse
 
-from database import User
-
-
-async def post(
-    url: str, data: dict | None = None, json: dict | None = None
-) -> Any | httpx.Response:
-    """Sends a `POST` request to passed url and returns a JSON response or `Reponse` instance if status code 204."""
-    async with httpx.AsyncClient() as client:
-        if json:
-            response = await client.post(url, json=json)
-        elif data:
-            response = await client.post(url, data=data)
-        else:
-            return "bro u forgot to pass data or json:("
-
-        if response.status_code != 204:
-            return response.json()
-
-        return response
+from auth.schemas import Principal
 
 
 def show_errors(
-    request: Request, templates: Jinja2Templates, user: User, errors: list,
+    request: Request, templates: Jinja2Templates, user: Principal,
+    errors: list,
     template: str
 ) -> _TemplateResponse:
     """Returns a `TemplateResponse` with errors."""
@@ -37,3 +22,69 @@ def show_errors(
             "request": request, "user": user, "errors": errors
         }
     )
+
+
+def make_etag(*parts: Any) -> str:
+    """Returns a strong ETag made of passed parts."""
+    digest = blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+
+    return f'"{digest}"'
+
+
+def validators(
+    etag: str, last_modified: datetime | None = None
+) -> dict[str, str]:
+    """Returns `ETag` and `Last-Modified` headers.
+
+    `last_modified` is a naive UTC datetime, as they are stored in db."""
+    headers = {"ETag": etag}
+    if last_modified:
+        headers["Last-Modified"] = format_datetime(
+            last_modified.replace(tzinfo=timezone.utc), usegmt=True
+        )
+
+    return headers
+
+
+def is_not_modified(
+    request: Request, etag: str, last_modified: datetime | None = None
+) -> bool:
+    """Checks conditional headers of the request.
+
+    `If-Modified-Since` is used only if there is no `If-None-Match`."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [
+            tag.strip().removeprefix("W/") for tag in if_none_match.split(",")
+        ]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+
+        # HTTP dates have no microseconds
+        last_modified = last_modified.replace(
+            microsecond=0, tzinfo=timezone.utc
+        )
+        return since.tzinfo is not None and last_modified <= since
+
+    return False
+
+
+def check_not_modified(
+    request: Request, response: Response, etag: str,
+    last_modified: datetime | None = None
+) -> None:
+    """Sets validators to the response.
+
+    Raises `HTTPException` with 304 status code if the request
+    has matching conditional headers."""
+    headers = validators(etag, last_modified)
+    response.headers.update(headers)
+
+    if is_not_modified(request, etag, last_modified):
+        raise HTTPException(HTTP_304_NOT_MODIFIED, headers=headers)
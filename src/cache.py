@@ -0,0 +1,88 @@
+from collections import OrderedDict
+from math import inf
+from time import monotonic
+from typing import Any, Callable, Hashable
+
+# Returned by `LRUCache.get` for missing keys, so `None` can be cached too
+MISSING = object()
+
+
+class LRUCache:
+    """Bounded per-process cache with LRU eviction and optional TTL.
+
+    Counts hits and misses to report its hit ratio."""
+
+    def __init__(self, maxsize: int, ttl: float | None = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        """Returns a cached value or `default` if it's missing or expired."""
+        item = self._data.get(key)
+        if item is None or item[0] < monotonic():
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+
+        return item[1]
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        """Caches a value for `ttl` seconds, but not longer than cache TTL."""
+        ttl = min(ttl or inf, self.ttl or inf)
+        self._data[key] = (monotonic() + ttl, value)
+        self._data.move_to_end(key)
+
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        """Removes a value from the cache."""
+        self._data.pop(key, None)
+
+    def evict(self, predicate: Callable[[Hashable, Any], bool]) -> None:
+        """Removes all values for which `predicate(key, value)` is true."""
+        for key, (_, value) in list(self._data.items()):
+            if predicate(key, value):
+                del self._data[key]
+
+    def clear(self) -> None:
+        """Removes all values from the cache."""
+        self._data.clear()
+
+    def stats(self) -> dict[str, int | float]:
+        """Returns size of the cache, its hits, misses and hit ratio."""
+        requests = self.hits + self.misses
+
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / requests if requests else 0.0,
+        }
+
+
+class ContentVersion:
+    """Counter that is bumped on every write of recipes.
+
+    Caches that have it in their keys never return content older
+    than the last write of this process."""
+
+    def __init__(self) -> None:
+        self.value = 0
+
+    def bump(self) -> None:
+        self.value += 1
+
+
+recipes_version = ContentVersion()
@@ -1,11 +1,111 @@
+from functools import partial
+from os import getenv
 from pathlib import Path
-from secrets import token_urlsafe
 from slowapi import Limiter
-from slowapi.util import get_remote_address
 
-limiter = Limiter(key_func=get_remote_address)
+from ratelimit import user_or_ip_key
+from signing import load_secret_keys
 
-SECRET = token_urlsafe()
-PROTOCOL = "http"
-HOST = "localhost"
-PORT = 8000
+# Default files are resolved from this file, not from the working
+# directory, so all workers of the host share them
+SRC_DIR = Path(__file__).parent
+
+# Keys of auth tokens, comma-separated in SECRET_KEYS or one per line
+# in SECRET_KEYS_FILE (created with a new key if missing). The first key
+# signs, all of them verify, so every worker and node accepts tokens of
+# the others and tokens survive restarts and key rotation
+SECRET_KEYS_FILE = getenv("SECRET_KEYS_FILE", str(SRC_DIR / "secret.keys"))
+SECRET_KEYS = load_secret_keys(getenv("SECRET_KEYS", ""), SECRET_KEYS_FILE)
+SECRET = SECRET_KEYS[0]
+# Number of previous keys kept by rotation
+SECRET_KEYS_KEEP = 2
+
+# Storage of rate limit counters. Default SQLite file is shared by all
+# workers of the host, `redis://host:port` works for several hosts
+RATELIMIT_STORAGE_URI = getenv(
+    "RATELIMIT_STORAGE_URI", f"sqlite:///{SRC_DIR / 'ratelimit.db'}"
+)
+
+# Authenticated users are limited by their ids, others by IP addresses
+limiter = Limiter(
+    key_func=partial(user_or_ip_key, secret_keys=SECRET_KEYS),
+    storage_uri=RATELIMIT_STORAGE_URI
+)
+
+DATABASE_URL = getenv("DATABASE_URL", "sqlite+aiosqlite:///./database.db")
+# Comma-separated URLs of read replicas, reads go to the primary if empty
+DATABASE_REPLICA_URLS = [
+    url for url in getenv("DATABASE_REPLICA_URLS", "").split(",") if url
+]
+# Seconds after a write during that the client reads from the primary,
+# so it sees its own writes even if replicas lag behind
+READ_YOUR_WRITES_TTL = int(getenv("READ_YOUR_WRITES_TTL", 5))
+
+# Connection pool of databases other than SQLite. Connections are
+# pinged before use and recycled, so restarts of the server are survived
+DATABASE_POOL_SIZE = int(getenv("DATABASE_POOL_SIZE", 10))
+DATABASE_MAX_OVERFLOW = int(getenv("DATABASE_MAX_OVERFLOW", 20))
+DATABASE_POOL_RECYCLE = int(getenv("DATABASE_POOL_RECYCLE", 1800))
+
+# Pragmas set on every SQLite connection. In WAL mode readers don't block
+# the writer and vice versa, writers wait `busy_timeout` ms for the lock
+# instead of failing with "database is locked". Negative `cache_size`
+# is in KiB. SQLite doesn't enforce foreign keys unless asked, so
+# recipes of a deleted user would stay without `foreign_keys`
+SQLITE_PRAGMAS = {
+    "foreign_keys": "ON",
+    "journal_mode": getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(getenv("SQLITE_BUSY_TIMEOUT", 5000)),
+    "cache_size": int(getenv("SQLITE_CACHE_SIZE", -64_000)),
+    "mmap_size": int(getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+    "temp_store": getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+
+# Seconds after that ids of recipes for random selection are reloaded
+RANDOM_POOL_TTL = 300
+
+# Cache of authenticated users by their tokens. Each worker has its own
+# cache, so invalidation reaches other workers only when TTL expires
+PRINCIPAL_CACHE_SIZE = 10_000
+PRINCIPAL_CACHE_TTL = 60
+
+# Cache of pages rendered for anonymous users. Writes of other workers
+# don't invalidate it, so TTL limits how long their pages can be stale
+PAGE_CACHE_SIZE = 512
+PAGE_CACHE_TTL = 10
+
+# Cache of numbers of recipes in filtered lists (search, author).
+# Writes of other workers don't invalidate it, so TTL limits how long
+# their totals can be wrong
+COUNT_CACHE_SIZE = 1024
+COUNT_CACHE_TTL = 60
+
+# Tracing of SQL queries of every request, off by default. Traced
+# responses have `Server-Timing` header with number and duration of
+# queries, requests over any threshold are logged with their queries
+SQL_TRACE = getenv("SQL_TRACE", "") == "1"
+SQL_TRACE_MAX_QUERIES = int(getenv("SQL_TRACE_MAX_QUERIES", 10))
+SQL_TRACE_MAX_DURATION = float(getenv("SQL_TRACE_MAX_DURATION", 0.1))
+# Statements of the same shape repeated that many times look like N+1
+SQL_TRACE_REPEATS = int(getenv("SQL_TRACE_REPEATS", 3))
+
+# Sampling profiler of requests. Superusers profile a request with
+# `__profile=1` query parameter or `X-Profile: 1` header, and every
+# `PROFILE_SAMPLE_RATE`-th request is profiled if it isn't 0. Profiles of
+# sampled requests are aggregated over `PROFILE_WINDOW` seconds. All
+# profiles are written to `PROFILE_DIR` as collapsed stacks
+PROFILE_DIR = getenv("PROFILE_DIR", "./profiles")
+PROFILE_INTERVAL = float(getenv("PROFILE_INTERVAL", 0.005))
+PROFILE_SAMPLE_RATE = int(getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_WINDOW = int(getenv("PROFILE_WINDOW", 300))
+
+# Max number of tracemalloc snapshots kept by a worker for
+# `/debug/memory`, the oldest are dropped
+MEMORY_MAX_SNAPSHOTS = 10
+
+# Max number of recipes in one bulk creation request
+BULK_MAX_RECIPES = 1000
+
+# Number of recipes fetched from the database at once by export
+EXPORT_BATCH_SIZE = 1000
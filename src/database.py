@@ -1,37 +1,136 @@
-from typing import AsyncGenerator
+from itertools import cycle
+from typing import AsyncGenerator, Awaitable, Callable
+
+from fastapi import Request, Response
 
 from sqlalchemy import (
-    TIMESTAMP, MetaData, String, Integer, ForeignKey, Boolean
+    DDL, TIMESTAMP, MetaData, String, Integer, ForeignKey, Boolean, Index,
+    event, column, table
 )
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import (
-    create_async_engine, async_sessionmaker, AsyncSession, AsyncAttrs
+    create_async_engine, async_sessionmaker, AsyncEngine, AsyncSession,
+    AsyncAttrs
 )
 from sqlalchemy.schema import CheckConstraint
 from sqlalchemy.orm import (
-    DeclarativeBase, mapped_column, Mapped, relationship
+    DeclarativeBase, Session, mapped_column, Mapped, relationship
 )
 from fastapi_users_db_sqlalchemy import SQLAlchemyBaseUserTable
 from datetime import datetime
 
-DATABASE_URL = "sqlite+aiosqlite:///./database.db"
+from config import (
+    DATABASE_URL, DATABASE_REPLICA_URLS, DATABASE_POOL_SIZE,
+    DATABASE_MAX_OVERFLOW, DATABASE_POOL_RECYCLE, READ_YOUR_WRITES_TTL,
+    SQLITE_PRAGMAS
+)
 
 
 class Base(AsyncAttrs, DeclarativeBase):
     pass
 
 
-engine = create_async_engine(DATABASE_URL)
+def set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """Applies `SQLITE_PRAGMAS` to a new SQLite connection."""
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+    cursor.close()
+
+
+def make_engine(url: str = DATABASE_URL, **kwargs) -> AsyncEngine:
+    """Creates an engine for `url`.
+
+    SQLite connections get `SQLITE_PRAGMAS`, other databases get
+    a sized connection pool with pre-ping. `kwargs` are passed to
+    `create_async_engine` and override the defaults."""
+    if make_url(url).get_backend_name() == "sqlite":
+        engine = create_async_engine(url, **kwargs)
+        event.listen(engine.sync_engine, "connect", set_sqlite_pragmas)
+        return engine
+
+    if "poolclass" not in kwargs:
+        kwargs = {
+            "pool_size": DATABASE_POOL_SIZE,
+            "max_overflow": DATABASE_MAX_OVERFLOW,
+            "pool_recycle": DATABASE_POOL_RECYCLE,
+            **kwargs,
+        }
+    kwargs.setdefault("pool_pre_ping", True)
+
+    return create_async_engine(url, **kwargs)
+
+
+engine = make_engine()
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
+replica_engines = [make_engine(url) for url in DATABASE_REPLICA_URLS]
+# Replicas take reads in turn, the primary takes them if there are none
+_read_session_makers = cycle([
+    async_sessionmaker(replica, expire_on_commit=False)
+    for replica in replica_engines
+] or [async_session_maker])
+
+# Cookie of clients that read from the primary after their writes
+READ_PRIMARY_COOKIE = "read_primary"
+
 metadata = MetaData()
 
 
-async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
-    """Generates a new asynchronous session."""
-    async with async_session_maker() as session:
+def get_read_session_maker() -> async_sessionmaker[AsyncSession]:
+    """Returns a session maker of the next read replica."""
+    return next(_read_session_makers)
+
+
+async def get_async_session(
+    request: Request
+) -> AsyncGenerator[AsyncSession, None]:
+    """Generates a new asynchronous session on the primary database.
+
+    Commits of the session make the client read from the primary
+    for `READ_YOUR_WRITES_TTL` seconds."""
+    async with async_session_maker(info={"request": request}) as session:
+        yield session
+
+
+async def get_read_session(
+    request: Request
+) -> AsyncGenerator[AsyncSession, None]:
+    """Generates a new asynchronous session for reads.
+
+    Session is opened on a read replica, or on the primary if the client
+    has written something recently."""
+    if request.cookies.get(READ_PRIMARY_COOKIE):
+        session_maker = async_session_maker
+    else:
+        session_maker = get_read_session_maker()
+
+    async with session_maker() as session:
         yield session
 
 
+@event.listens_for(Session, "after_commit")
+def remember_write(session: Session) -> None:
+    """Marks the request whose session committed as a write."""
+    if request := session.info.get("request"):
+        request.state.wrote = True
+
+
+async def read_your_writes(
+    request: Request, call_next: Callable[[Request], Awaitable[Response]]
+) -> Response:
+    """Middleware that sets `READ_PRIMARY_COOKIE` after writes."""
+    response = await call_next(request)
+
+    if getattr(request.state, "wrote", False):
+        response.set_cookie(
+            READ_PRIMARY_COOKIE, "1",
+            max_age=READ_YOUR_WRITES_TTL, httponly=True
+        )
+
+    return response
+
+
 # Models
 class Recipe(Base):
     __tablename__ = "recipe"
@@ -42,14 +141,19 @@ class Recipe(Base):
     pub_date: Mapped[datetime] = mapped_column(
         TIMESTAMP, default=datetime.utcnow
     )
+    updated_at: Mapped[datetime | None] = mapped_column(
+        TIMESTAMP, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
     author_id: Mapped[int] = mapped_column(
         Integer, ForeignKey(
             "recipes_user.id", 
             ondelete="CASCADE"
         ), nullable=False, unique=False
     )
+    # Never loaded implicitly, lists select `User.username` and a recipe
+    # by id joins its author with `contains_eager`
     author: Mapped["User"] = relationship(
-        back_populates="recipes", lazy="selectin"
+        back_populates="recipes", lazy="raise"
     )
 
     __table_args__ = (
@@ -60,6 +164,12 @@ class Recipe(Base):
     )
 
 
+# Latest recipes, with and without `author` filter, are read in index
+# order, so neither of listings sorts the table
+Index("ix_recipe_pub_date_id", Recipe.pub_date.desc(), Recipe.id.desc())
+Index("ix_recipe_author_id_pub_date", Recipe.author_id, Recipe.pub_date)
+
+
 class User(SQLAlchemyBaseUserTable[int], Base):
     __tablename__ = "recipes_user"
 
@@ -70,8 +180,9 @@ class User(SQLAlchemyBaseUserTable[int], Base):
     hashed_password: Mapped[str] = mapped_column(
         String(length=1024), nullable=False
     )
+    # Never loaded implicitly, use `author` filter of recipes listing instead
     recipes: Mapped[list["Recipe"]] = relationship(
-        back_populates="author", lazy="selectin"
+        back_populates="author", lazy="raise", passive_deletes=True
     )
     is_active: Mapped[bool] = mapped_column(
         Boolean, default=True, nullable=False
@@ -85,3 +196,69 @@ class User(SQLAlchemyBaseUserTable[int], Base):
 
     def __repr__(self) -> str:
         return self.username
+
+
+# Full-text search index over recipes, kept in sync with `recipe` table
+# by triggers, so every way of writing recipes updates it
+recipe_fts = table("recipe_fts", column("rowid"))
+
+RECIPE_FTS_DDL = (
+    """CREATE VIRTUAL TABLE recipe_fts USING fts5(
+        headling, text, content='recipe', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER recipe_fts_insert AFTER INSERT ON recipe BEGIN
+        INSERT INTO recipe_fts(rowid, headling, text)
+        VALUES (new.id, new.headling, new.text);
+    END""",
+    """CREATE TRIGGER recipe_fts_delete AFTER DELETE ON recipe BEGIN
+        INSERT INTO recipe_fts(recipe_fts, rowid, headling, text)
+        VALUES ('delete', old.id, old.headling, old.text);
+    END""",
+    """CREATE TRIGGER recipe_fts_update AFTER UPDATE OF headling, text
+    ON recipe BEGIN
+        INSERT INTO recipe_fts(recipe_fts, rowid, headling, text)
+        VALUES ('delete', old.id, old.headling, old.text);
+        INSERT INTO recipe_fts(rowid, headling, text)
+        VALUES (new.id, new.headling, new.text);
+    END""",
+)
+
+for statement in RECIPE_FTS_DDL:
+    event.listen(
+        Recipe.__table__, "after_create",
+        DDL(statement).execute_if(dialect="sqlite")
+    )
+event.listen(
+    Recipe.__table__, "before_drop",
+    DDL("DROP TABLE IF EXISTS recipe_fts").execute_if(dialect="sqlite")
+)
+
+# Number of recipes, kept by triggers in the same transaction as writes,
+# so pagination of all recipes doesn't count the table
+recipe_stats = table("recipe_stats", column("recipe_count"))
+
+RECIPE_STATS_DDL = (
+    """CREATE TABLE recipe_stats (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        recipe_count INTEGER NOT NULL
+    )""",
+    """INSERT INTO recipe_stats (id, recipe_count)
+    VALUES (1, (SELECT count(*) FROM recipe))""",
+    """CREATE TRIGGER recipe_stats_insert AFTER INSERT ON recipe BEGIN
+        UPDATE recipe_stats SET recipe_count = recipe_count + 1;
+    END""",
+    """CREATE TRIGGER recipe_stats_delete AFTER DELETE ON recipe BEGIN
+        UPDATE recipe_stats SET recipe_count = recipe_count - 1;
+    END""",
+)
+
+for statement in RECIPE_STATS_DDL:
+    event.listen(
+        Recipe.__table__, "after_create",
+        DDL(statement).execute_if(dialect="sqlite")
+    )
+event.listen(
+    Recipe.__table__, "before_drop",
+    DDL("DROP TABLE IF EXISTS recipe_stats").execute_if(dialect="sqlite")
+)
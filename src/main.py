@@ -1,20 +1,38 @@
+from pathlib import Path
+
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
-from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 
 from auth.auth_config import fastapi_users, auth_backend
 from auth.schemas import UserRead, UserCreate
+from auth.utils import principal_cache
 from config import limiter
-from recipes.router import router as recipes_router
+from database import read_your_writes
+from memory import router as memory_router
+from metrics import (
+    cache_metrics, counter_metric, record_metrics, render_metrics
+)
+from profiling import profile_requests, router as profiles_router
+from ratelimit import rate_limit_exceeded_handler, rejected_requests
+from recipes.router import recipe_counts, router as recipes_router
+from pages.cache import page_cache
 from pages.router import router as pages_router
 
 app = FastAPI(title="Recipes")
 app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
-# Static files
-if __name__ == "main":
-    app.mount(f"/static/", StaticFiles(directory="static"), name="static")
+app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded_handler)
+app.middleware("http")(read_your_writes)
+app.middleware("http")(profile_requests)
+# Outermost, so latency includes other middlewares
+app.middleware("http")(record_metrics)
+# Static files, resolved from this file, so the app runs from any
+# working directory
+app.mount(
+    "/static/", StaticFiles(directory=Path(__file__).parent / "static"),
+    name="static"
+)
 
 # Auth routers
 auth_router = fastapi_users.get_auth_router(auth_backend)
@@ -34,3 +52,23 @@ app.include_router(
 # Other routers
 app.include_router(recipes_router)
 app.include_router(pages_router)
+app.include_router(memory_router)
+app.include_router(profiles_router)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+    """Metrics of this worker in Prometheus text format."""
+    caches = {
+        "page": page_cache, "principal": principal_cache,
+        "recipe_count": recipe_counts,
+    }
+
+    return PlainTextResponse(render_metrics(
+        *cache_metrics(caches),
+        counter_metric(
+            "ratelimit_rejected_total",
+            "Number of requests rejected by rate limits.",
+            "route", rejected_requests
+        ),
+    ), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,192 @@
+import gc
+import os
+import tracemalloc
+from collections import Counter
+from typing import Any, Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from starlette.status import HTTP_404_NOT_FOUND, HTTP_409_CONFLICT
+
+from auth.auth_config import current_superuser
+from config import MEMORY_MAX_SNAPSHOTS
+
+# Handlers are sync, so FastAPI runs them in a thread pool and walking
+# the heap doesn't block the event loop
+router = APIRouter(
+    prefix="/debug/memory",
+    dependencies=[Depends(current_superuser)],
+    include_in_schema=False,
+)
+
+# Snapshots of this worker by names, the oldest are dropped
+snapshots: dict[str, tracemalloc.Snapshot] = {}
+
+# Allocations of tracemalloc itself and of imports aren't leaks
+IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def rss_bytes() -> int | None:
+    """Returns current resident set size of the process, Linux only."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return None
+
+
+def take_snapshot() -> tracemalloc.Snapshot:
+    if not tracemalloc.is_tracing():
+        raise HTTPException(HTTP_409_CONFLICT, "Tracing isn't started")
+
+    return tracemalloc.take_snapshot().filter_traces(IGNORED)
+
+
+def get_snapshot(name: str) -> tracemalloc.Snapshot:
+    snapshot = snapshots.get(name)
+    if snapshot is None:
+        raise HTTPException(HTTP_404_NOT_FOUND, "Snapshot not found")
+
+    return snapshot
+
+
+def format_stat(
+    stat: tracemalloc.StatisticDiff | tracemalloc.Statistic
+) -> dict[str, Any]:
+    return {
+        "traceback": [
+            f"{frame.filename}:{frame.lineno}" for frame in stat.traceback
+        ],
+        "size": stat.size,
+        "size_diff": getattr(stat, "size_diff", None),
+        "count": stat.count,
+        "count_diff": getattr(stat, "count_diff", None),
+    }
+
+
+def count_types(limit: int, match: str | None = None) -> dict[str, int]:
+    """Returns numbers of live objects tracked by gc by types, the most
+    common first. If `match` is passed, only types with it in their
+    names are counted."""
+    counts = Counter(
+        f"{type(obj).__module__}.{type(obj).__qualname__}"
+        for obj in gc.get_objects()
+    )
+    if match is not None:
+        counts = Counter({
+            name: n for name, n in counts.items() if match in name
+        })
+
+    return dict(counts.most_common(limit))
+
+
+@router.get("/")
+def memory_stats(
+    limit: int = Query(ge=1, le=1000, default=30),
+    match: str | None = None, collect: bool = False
+) -> dict[str, Any]:
+    """Returns RSS, tracemalloc state, gc stats and numbers of live
+    objects by types.
+
+    :param `match`:
+
+    Counts only types with it in their names, e.g. `Recipe` counts
+    `database.Recipe` and `recipes.schemas.RecipeResponse` instances.
+
+    :param `collect`:
+
+    Runs full garbage collection first, so only reachable objects
+    are counted."""
+    collected = gc.collect() if collect else None
+    current, peak = tracemalloc.get_traced_memory()
+
+    return {
+        "rss": rss_bytes(),
+        "tracing": tracemalloc.is_tracing(),
+        "traced_memory": {"current": current, "peak": peak},
+        "snapshots": list(snapshots),
+        "gc": {
+            "collected": collected,
+            "counts": gc.get_count(),
+            "thresholds": gc.get_threshold(),
+            "generations": gc.get_stats(),
+            "garbage": len(gc.garbage),
+        },
+        "types": count_types(limit, match),
+    }
+
+
+@router.post("/start")
+def start_tracing(
+    frames: int = Query(ge=1, le=100, default=1)
+) -> dict[str, Any]:
+    """Starts tracing allocations, keeping `frames` frames of their
+    tracebacks. Tracing slows down the worker, stop it when done."""
+    if tracemalloc.is_tracing():
+        raise HTTPException(HTTP_409_CONFLICT, "Tracing is already started")
+
+    tracemalloc.start(frames)
+
+    return {"tracing": True, "frames": frames}
+
+
+@router.post("/stop")
+def stop_tracing() -> dict[str, Any]:
+    """Stops tracing and removes all snapshots."""
+    tracemalloc.stop()
+    snapshots.clear()
+
+    return {"tracing": False}
+
+
+@router.post("/snapshots/{name}")
+def create_snapshot(name: str) -> dict[str, Any]:
+    """Takes a snapshot of traced allocations under passed name."""
+    if name == "current":
+        raise HTTPException(HTTP_409_CONFLICT, "This name is reserved")
+
+    snapshot = take_snapshot()
+    snapshots.pop(name, None)
+    snapshots[name] = snapshot
+    while len(snapshots) > MEMORY_MAX_SNAPSHOTS:
+        snapshots.pop(next(iter(snapshots)))
+
+    return {
+        "name": name,
+        "size": sum(trace.size for trace in snapshot.traces),
+        "snapshots": list(snapshots),
+    }
+
+
+@router.delete("/snapshots/{name}")
+def delete_snapshot(name: str) -> dict[str, str]:
+    get_snapshot(name)
+    del snapshots[name]
+
+    return {"detail": "Snapshot has been deleted"}
+
+
+@router.get("/snapshots/{name}")
+def snapshot_stats(
+    name: str, key_type: Literal["filename", "lineno", "traceback"] = "lineno",
+    compare_to: str | None = None,
+    limit: int = Query(ge=1, le=1000, default=30)
+) -> list[dict[str, Any]]:
+    """Returns top allocations of the snapshot grouped by `key_type`.
+    `current` name takes a new snapshot.
+
+    :param `compare_to`:
+
+    Name of an older snapshot, returns differences from it instead,
+    the biggest growth first."""
+    snapshot = take_snapshot() if name == "current" else get_snapshot(name)
+    if compare_to is None:
+        stats = snapshot.statistics(key_type)
+    else:
+        stats = snapshot.compare_to(get_snapshot(compare_to), key_type)
+
+    return [format_stat(stat) for stat in stats[:limit]]
@@ -0,0 +1,256 @@
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Any, Awaitable, Callable, Iterator
+
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from cache import LRUCache
+from config import SQL_TRACE
+from tracing import trace_queries
+
+# Pairs of label names and values
+Labels = tuple[tuple[str, Any], ...]
+
+# Upper bounds of latency buckets, seconds
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+
+
+class Metric:
+    """Pre-aggregated metric of this worker, rendered in Prometheus format.
+
+    Values are plain dicts by label values, updated without locks:
+    every update happens on the event loop thread."""
+
+    type = "untyped"
+
+    def __init__(
+        self, name: str, help: str, labelnames: tuple[str, ...] = ()
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+
+    def samples(self) -> Iterator[tuple[str, Labels, float]]:
+        """Yields `(name, labels, value)` of every sample."""
+        for values, value in list(self._values.items()):
+            yield self.name, tuple(zip(self.labelnames, values)), value
+
+    def render(self) -> str:
+        """Renders the metric in Prometheus text format."""
+        lines = [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{format_labels(labels)} {value}")
+
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, labels: tuple = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def inc(self, labels: tuple = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, labels: tuple = (), amount: float = 1) -> None:
+        self.inc(labels, -amount)
+
+    def set(self, labels: tuple, value: float) -> None:
+        self._values[labels] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self, name: str, help: str, labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = buckets
+        # Label values -> [counts of buckets and +Inf, sum]
+        self._values: dict[tuple, list] = {}
+
+    def observe(self, labels: tuple, value: float) -> None:
+        item = self._values.get(labels)
+        if item is None:
+            item = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+
+        item[0][bisect_left(self.buckets, value)] += 1
+        item[1] += value
+
+    def samples(self) -> Iterator[tuple[str, Labels, float]]:
+        for values, (counts, total) in list(self._values.items()):
+            labels = tuple(zip(self.labelnames, values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                yield (
+                    f"{self.name}_bucket", labels + (("le", bound),),
+                    cumulative
+                )
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+def format_labels(labels: Labels) -> str:
+    """Formats labels as `{name="value",...}`, escaping the values."""
+    if not labels:
+        return ""
+
+    pairs = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace(
+            '"', '\\"'
+        ).replace("\n", "\\n")
+        pairs.append(f'{name}="{value}"')
+
+    return "{" + ",".join(pairs) + "}"
+
+
+requests_total = Counter(
+    "http_requests_total", "Number of HTTP requests.",
+    ("method", "route", "status")
+)
+request_duration = Histogram(
+    "http_request_duration_seconds", "Latency of HTTP requests.",
+    ("method", "route")
+)
+requests_in_progress = Gauge(
+    "http_requests_in_progress", "Number of HTTP requests being handled.",
+    ("method",)
+)
+db_query_duration = Histogram(
+    "db_query_duration_seconds", "Duration of SQL queries by route.",
+    ("route",)
+)
+
+METRICS: list[Metric] = [
+    requests_total, request_duration, requests_in_progress, db_query_duration
+]
+
+
+class RequestStats:
+    """Durations of SQL queries made while handling a request.
+
+    If `trace` is true, also keeps every statement with its duration
+    and row count."""
+
+    __slots__ = ("queries", "statements")
+
+    def __init__(self, trace: bool = False) -> None:
+        self.queries: list[float] = []
+        self.statements: list[tuple[str, float, int]] | None = (
+            [] if trace else None
+        )
+
+
+# Stats of the request being handled, SQL queries outside of requests
+# (e.g. CLI) aren't recorded
+request_stats: ContextVar[RequestStats | None] = ContextVar(
+    "request_stats", default=None
+)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def start_query_timer(conn, cursor, statement, *args) -> None:
+    if request_stats.get() is not None:
+        conn.info.setdefault("query_started_at", []).append(perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def stop_query_timer(conn, cursor, statement, *args) -> None:
+    stats = request_stats.get()
+    started_at = conn.info.get("query_started_at")
+    if stats is None or not started_at:
+        return
+
+    duration = perf_counter() - started_at.pop()
+    stats.queries.append(duration)
+    if stats.statements is not None:
+        # Number of affected rows, SQLite doesn't know it for SELECT (-1)
+        stats.statements.append((statement, duration, cursor.rowcount))
+
+
+def route_name(request: Request) -> str:
+    """Returns a path template of the matched route, so ids in paths
+    don't make a metric per recipe."""
+    route = request.scope.get("route")
+
+    return getattr(route, "path", "unmatched")
+
+
+async def record_metrics(
+    request: Request, call_next: Callable[[Request], Awaitable[Response]]
+) -> Response:
+    """Middleware that records latency, status and SQL queries of requests."""
+    method = request.method
+    stats = RequestStats(trace=SQL_TRACE)
+    token = request_stats.set(stats)
+    requests_in_progress.inc((method,))
+    started_at = perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        if stats.statements is not None:
+            trace_queries(request, response, stats.statements)
+
+        return response
+    finally:
+        duration = perf_counter() - started_at
+        requests_in_progress.dec((method,))
+        request_stats.reset(token)
+
+        route = route_name(request)
+        requests_total.inc((method, route, status))
+        request_duration.observe((method, route), duration)
+        for query_duration in stats.queries:
+            db_query_duration.observe((route,), query_duration)
+
+
+def cache_metrics(caches: dict[str, LRUCache]) -> list[Metric]:
+    """Returns current size, hits and misses of caches by their names."""
+    size = Gauge("cache_size", "Number of cached values.", ("cache",))
+    hits = Counter("cache_hits_total", "Number of cache hits.", ("cache",))
+    misses = Counter(
+        "cache_misses_total", "Number of cache misses.", ("cache",)
+    )
+    for name, cache in caches.items():
+        size.set((name,), len(cache))
+        hits.inc((name,), cache.hits)
+        misses.inc((name,), cache.misses)
+
+    return [size, hits, misses]
+
+
+def counter_metric(
+    name: str, help: str, label: str, counts: dict[str, int]
+) -> Counter:
+    """Returns a counter with values of `counts` by `label`."""
+    counter = Counter(name, help, (label,))
+    for value, count in counts.items():
+        counter.inc((value,), count)
+
+    return counter
+
+
+def render_metrics(*extra: Metric) -> str:
+    """Renders all metrics in Prometheus text format."""
+    return "\n".join(
+        metric.render() for metric in (*METRICS, *extra)
+    ) + "\n"
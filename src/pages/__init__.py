@@ -1,10 +1,12 @@
 import re
+from pathlib import Path
 
 from fastapi.templating import Jinja2Templates
 from fastapi.datastructures import URL
 from markupsafe import Markup
 
-templates = Jinja2Templates("templates")
+# Resolved from this file, so pages render from any working directory
+templates = Jinja2Templates(Path(__file__).parent.parent / "templates")
 templates.env.globals["URL"] = URL
 templates.env.globals["str"] = str
 
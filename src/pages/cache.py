@@ -0,0 +1,73 @@
+from email.utils import parsedate_to_datetime
+
+from fastapi import Request
+from fastapi.responses import HTMLResponse, Response
+from starlette.status import HTTP_304_NOT_MODIFIED
+
+from auth.schemas import Principal
+from base_utils import is_not_modified
+from cache import LRUCache, MISSING, recipes_version
+from config import PAGE_CACHE_SIZE, PAGE_CACHE_TTL
+
+# Rendered pages by route, params and content version
+page_cache = LRUCache(PAGE_CACHE_SIZE, PAGE_CACHE_TTL)
+
+
+def page_cache_key(request: Request) -> tuple:
+    """Returns a cache key of the page for passed request."""
+    return (
+        str(request.base_url), request.url.path,
+        tuple(sorted(request.query_params.multi_items())),
+        recipes_version.value,
+    )
+
+
+# Headers of a page that are cached with it
+CACHED_HEADERS = ("etag", "last-modified", "vary")
+
+
+def get_cached_page(
+    request: Request, user: Principal | None
+) -> Response | None:
+    """Returns a cached page if it was rendered for an anonymous user.
+
+    If the request has `If-None-Match` with ETag of the cached page
+    or `If-Modified-Since` not before its `Last-Modified`, returns 304
+    response without body, like the uncached page."""
+    if user:
+        return None
+
+    cached = page_cache.get(page_cache_key(request))
+    if cached is MISSING:
+        return None
+
+    body, status_code, headers = cached
+    headers = headers | {"X-Cache": "HIT"}
+
+    last_modified = None
+    if "last-modified" in headers:
+        last_modified = parsedate_to_datetime(headers["last-modified"])
+    if "etag" in headers and is_not_modified(
+        request, headers["etag"], last_modified
+    ):
+        return Response(status_code=HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return HTMLResponse(body, status_code, headers=headers)
+
+
+def cache_page(
+    request: Request, user: Principal | None, response: Response
+) -> Response:
+    """Caches a page rendered for an anonymous user and returns it."""
+    if not user:
+        headers = {
+            name: value for name, value in response.headers.items()
+            if name in CACHED_HEADERS
+        }
+        page_cache.set(
+            page_cache_key(request),
+            (response.body, response.status_code, headers)
+        )
+        response.headers["X-Cache"] = "MISS"
+
+    return response
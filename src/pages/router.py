@@ -1,23 +1,30 @@
 from typing import Annotated
 
 from fastapi import APIRouter, HTTPException, Request, Depends, Form
-from fastapi.responses import RedirectResponse
-from starlette.status import HTTP_404_NOT_FOUND, HTTP_302_FOUND
+from fastapi.responses import RedirectResponse, Response
+from starlette.status import (
+    HTTP_404_NOT_FOUND, HTTP_302_FOUND, HTTP_304_NOT_MODIFIED
+)
 from starlette.templating import _TemplateResponse
+from fastapi_users import exceptions
+from fastapi_users.authentication import JWTStrategy
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from json.decoder import JSONDecodeError
 
 from pages import templates
+from pages.cache import cache_page, get_cached_page
 from auth.utils import check_email, check_password, check_passwords, _login
-from auth.auth_config import optional_current_user
-from config import PROTOCOL, HOST, PORT
-from database import User, get_async_session
+from auth.auth_config import optional_current_user, get_jwt_strategy
+from auth.manager import UserManager, get_user_manager
+from auth.schemas import Principal, UserCreate
+from database import get_async_session, get_read_session
 from recipes.router import (
     _create_recipe, _get_recipes, _update_recipe, _delete_recipe
 )
 from recipes.schemas import RecipeCreate, RecipeResponse
 from recipes.utils import validate_recipe_fields
-from base_utils import post, show_errors
+from base_utils import is_not_modified, make_etag, show_errors, validators
 
 router = APIRouter(
     tags=["Pages"],
@@ -27,13 +34,17 @@ router = APIRouter(
 @router.get("/")
 async def index(
     request: Request,
-    page: int = 1, session: AsyncSession = Depends(get_async_session),
-    user: User = Depends(optional_current_user),
+    page: int = 1, cursor: str | None = None,
+    session: AsyncSession = Depends(get_read_session),
+    user: Principal = Depends(optional_current_user),
 ) -> _TemplateResponse:
     """Home page."""
+    if cached := get_cached_page(request, user):
+        return cached
+
     context = {"request": request, "user": user}
     try:
-        recipes = await _get_recipes(session, page=page)
+        recipes = await _get_recipes(session, page=page, cursor=cursor)
     except HTTPException:
         recipes = None
     else:
@@ -41,12 +52,14 @@ async def index(
 
     context["recipes"] = recipes
 
-    return templates.TemplateResponse("index.html", context)
+    return cache_page(
+        request, user, templates.TemplateResponse("index.html", context)
+    )
 
 
 @router.get("/register/")
 async def register(
-    request: Request, user: User = Depends(optional_current_user)
+    request: Request, user: Principal = Depends(optional_current_user)
 ) -> _TemplateResponse:
     """Register page with form."""
     return templates.TemplateResponse(
@@ -59,7 +72,9 @@ async def register(
     request: Request, username: Annotated[str, Form()],
     email: Annotated[str, Form()],
     password: Annotated[str, Form()], password1: Annotated[str, Form()],
-    user: User = Depends(optional_current_user)
+    user: Principal = Depends(optional_current_user),
+    user_manager: UserManager = Depends(get_user_manager),
+    strategy: JWTStrategy = Depends(get_jwt_strategy)
 ) -> _TemplateResponse | RedirectResponse:
     """Processes a data from register page form."""
     errors = []
@@ -84,38 +99,31 @@ async def register(
         )
 
     # Creating a new user
-    user_dict = {
-        "username": username, "email": email, "password": password
-    }
     try:
-        user = await post(f"{PROTOCOL}://{HOST}:{PORT}/auth/register", json=user_dict)
-    # If user already exists, but occurs SQLAlchemy exception
-    except JSONDecodeError:
+        await user_manager.create(UserCreate(
+            username=username, email=email, password=password
+        ), safe=True, request=request)
+    # Username is unique too, but only email is checked by user manager
+    except (exceptions.UserAlreadyExists, IntegrityError):
         errors.append("User already exists")
-        return show_errors(
-            request, templates, user, errors, "auth/register.html"
-        )
-    else:
-        # Some more validations
-        if user.get("detail") == "REGISTER_USER_ALREADY_EXISTS":
-            errors.append("User already exists")
-        elif user.get("detail") and user.get("detail").get("ctx").get("reason"):
-            errors.append(user["detail"]["ctx"]["reason"])
+    except exceptions.InvalidPasswordException as e:
+        errors.append(e.reason)
+    except ValidationError as e:
+        errors.extend(error["msg"] for error in e.errors())
 
     if errors:
         return show_errors(
             request, templates, user, errors, "auth/register.html"
         )
 
-    return await _login(request, templates, data={
-        "username": user_dict["email"],
-        "password": user_dict["password"]
-    }, after_register=True)
+    return await _login(request, templates, user_manager, strategy, data={
+        "username": email, "password": password
+    })
 
 
 @router.get("/login/")
 async def login(
-    request: Request, user: User = Depends(optional_current_user)
+    request: Request, user: Principal = Depends(optional_current_user)
 ) -> _TemplateResponse:
     """Login page with form."""
     return templates.TemplateResponse(
@@ -127,7 +135,9 @@ async def login(
 async def login(
     request: Request, email: Annotated[str, Form()],
     password: Annotated[str, Form()],
-    user: User = Depends(optional_current_user)
+    user: Principal = Depends(optional_current_user),
+    user_manager: UserManager = Depends(get_user_manager),
+    strategy: JWTStrategy = Depends(get_jwt_strategy)
 ) -> _TemplateResponse | RedirectResponse:
     """Processes a data from login page form."""
     errors = []
@@ -144,14 +154,14 @@ async def login(
             request, templates, user, errors, "auth/login.html"
         )
 
-    return await _login(request, templates, data={
+    return await _login(request, templates, user_manager, strategy, data={
         "username": email, "password": password
     })
 
 
 @router.get("/logout/", response_model=None)
 async def logout(
-    request: Request, user: User = Depends(optional_current_user)
+    request: Request, user: Principal = Depends(optional_current_user)
 ) -> RedirectResponse | _TemplateResponse:
     """Logout page."""
     if not user:
@@ -160,6 +170,9 @@ async def logout(
     response = templates.TemplateResponse(
         "/auth/logout.html", {"request": request}
     )
+    await get_jwt_strategy().destroy_token(
+        request.cookies.get("fastapiusersauth"), user
+    )
     response.delete_cookie("fastapiusersauth")
 
     return response
@@ -167,7 +180,7 @@ async def logout(
 
 @router.get("/create/", response_model=None)
 async def create(
-    request: Request, user: User = Depends(optional_current_user)
+    request: Request, user: Principal = Depends(optional_current_user)
 ) -> RedirectResponse | _TemplateResponse:
     """Create recipe page with form."""
     if not user:
@@ -183,7 +196,7 @@ async def create(
     request: Request, headling: Annotated[str, Form()],
     text: Annotated[str, Form()],
     session: AsyncSession = Depends(get_async_session),
-    user: User = Depends(optional_current_user)
+    user: Principal = Depends(optional_current_user)
 ) -> _TemplateResponse | RedirectResponse:
     """Processes a data from create recipe page form."""
     errors = []
@@ -207,36 +220,53 @@ async def create(
     )
 
 
-@router.get("/recipe/{id}/")
+@router.get("/recipe/{id}/", response_model=None)
 async def recipe(
     request: Request, id: int,
-    session: AsyncSession = Depends(get_async_session),
-    user: User = Depends(optional_current_user)
-) -> _TemplateResponse:
+    session: AsyncSession = Depends(get_read_session),
+    user: Principal = Depends(optional_current_user)
+) -> _TemplateResponse | Response:
     """Recipe page."""
+    if cached := get_cached_page(request, user):
+        return cached
+
     context = {"request": request, "user": user}
 
     try:
         recipe = await _get_recipes(session, id=id)
     except HTTPException:
-        return templates.TemplateResponse(
+        return cache_page(request, user, templates.TemplateResponse(
             "404.html", context, status_code=HTTP_404_NOT_FOUND
-        )
+        ))
 
     context["recipe"] = recipe
-    recipes = await _get_recipes(session, size=3)
+    recipes = await _get_recipes(session, size=3, count=False)
     recipes.pop()
     context["recipes"] = recipes
-    
 
-    return templates.TemplateResponse("/recipes/recipe.html", context)
+    # Page depends on the recipe, the latest recipes and the user
+    etag = make_etag(
+        recipe.id, recipe.updated_at,
+        [(item["id"], item["updated_at"]) for item in recipes],
+        user.id if user else None
+    )
+    last_modified = recipe.updated_at or recipe.pub_date
+    headers = validators(etag, last_modified) | {"Vary": "Cookie"}
+
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=HTTP_304_NOT_MODIFIED, headers=headers)
+
+    response = templates.TemplateResponse("/recipes/recipe.html", context)
+    response.headers.update(headers)
+
+    return cache_page(request, user, response)
 
 
 @router.get("/update/{id}/", response_model=None)
 async def update(
     request: Request, id: int,
-    session: AsyncSession = Depends(get_async_session),
-    user: User = Depends(optional_current_user)
+    session: AsyncSession = Depends(get_read_session),
+    user: Principal = Depends(optional_current_user)
 ) -> _TemplateResponse | RedirectResponse:
     """Update recipe page with form."""
     context = {"request": request, "user": user}
@@ -260,7 +290,7 @@ async def update(
     request: Request, id: int, headling: Annotated[str, Form()],
     text: Annotated[str, Form()],
     session: AsyncSession = Depends(get_async_session),
-    user: User = Depends(optional_current_user)
+    user: Principal = Depends(optional_current_user)
 ) -> RedirectResponse | _TemplateResponse:
     """Processes a data from update recipe page form."""
     errors = []
@@ -293,7 +323,7 @@ async def update(
 async def delete(
     request: Request, id: int,
     session: AsyncSession = Depends(get_async_session),
-    user: User = Depends(optional_current_user)
+    user: Principal = Depends(optional_current_user)
 ) -> _TemplateResponse | RedirectResponse:
     """Delete recipe page."""
     context = {"request": request, "user": user}
@@ -314,7 +344,7 @@ async def delete(
 
 @router.get("/random/")
 async def random_recipe(
-    request: Request, session: AsyncSession = Depends(get_async_session),
+    request: Request, session: AsyncSession = Depends(get_read_session),
 ) -> RedirectResponse:
     """Getting random recipe and redirects to this page."""
     recipe = await _get_recipes(session, random=True)
@@ -327,20 +357,28 @@ async def random_recipe(
 @router.get("/search/")
 async def search(
     request: Request, search_query: str, page: int = 1,
-    session: AsyncSession = Depends(get_async_session),
-    user: User = Depends(optional_current_user)
+    cursor: str | None = None,
+    session: AsyncSession = Depends(get_read_session),
+    user: Principal = Depends(optional_current_user)
 ):
     """Searches for a recipe that matches the `search_query`."""
+    if cached := get_cached_page(request, user):
+        return cached
+
     context = {
         "request": request, "user": user, "search_query": search_query
     }
 
     try:
-        recipes = await _get_recipes(session, search_query, page=page)
+        recipes = await _get_recipes(
+            session, search_query, page=page, cursor=cursor
+        )
     except HTTPException:
         recipes = None
     else:
         context["recipes"] = recipes
         context["paginator"] = recipes.pop()
 
-    return templates.TemplateResponse("search.html", context)
+    return cache_page(
+        request, user, templates.TemplateResponse("search.html", context)
+    )
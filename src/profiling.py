@@ -0,0 +1,206 @@
+import os
+import re
+import sys
+import threading
+from collections import Counter
+from datetime import datetime
+from itertools import count
+from time import time
+from typing import Awaitable, Callable
+from uuid import uuid4
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.status import HTTP_404_NOT_FOUND
+
+from auth.auth_config import current_superuser, get_request_principal
+from config import (
+    PROFILE_DIR, PROFILE_INTERVAL, PROFILE_SAMPLE_RATE, PROFILE_WINDOW
+)
+
+router = APIRouter(
+    prefix="/debug/profiles",
+    dependencies=[Depends(current_superuser)],
+    include_in_schema=False,
+)
+
+# Characters of a path that can't be in a file name
+UNSAFE = re.compile(r"[^A-Za-z0-9_.-]+")
+PROFILE_NAME = re.compile(r"[A-Za-z0-9_.-]+\.collapsed")
+
+
+def frame_name(frame) -> str:
+    code = frame.f_code
+
+    return (
+        f"{code.co_name} "
+        f"({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    )
+
+
+def collapse(frame) -> str:
+    """Returns a stack of the frame as `root;...;leaf` string."""
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+
+    return ";".join(reversed(names))
+
+
+class Sampler:
+    """Statistical profiler of one thread.
+
+    A background thread takes a stack of the profiled thread every
+    `interval` seconds and counts equal stacks. Python switches threads
+    every 5 ms by default (`sys.getswitchinterval()`), so CPU-bound code
+    is sampled at most that often. Requests run on the event loop thread,
+    so stacks of other requests handled at the same time get into
+    the profile too."""
+
+    def __init__(self, thread_id: int, interval: float) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+
+def write_profile(name: str, stacks: Counter[str]) -> str:
+    """Writes stacks in collapsed format to `PROFILE_DIR`, returns
+    a path of the file.
+
+    Collapsed stacks are opened by https://www.speedscope.app and
+    `flamegraph.pl` as flame graphs."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{name}.collapsed")
+    with open(path, "w") as f:
+        for stack, n in stacks.most_common():
+            f.write(f"{stack} {n}\n")
+
+    return path
+
+
+class ProfileWindow:
+    """Stacks of sampled requests, aggregated over `window` seconds.
+
+    A window ends with the first sampled request after `window` seconds,
+    that request writes it to a file."""
+
+    def __init__(self, window: float) -> None:
+        self.window = window
+        self.stacks: Counter[str] = Counter()
+        self.requests = 0
+        self.started_at = time()
+
+    def add(self, stacks: Counter[str]) -> tuple[str, Counter[str]] | None:
+        """Adds stacks of a request, returns a name and stacks of the window
+        if it has ended."""
+        self.stacks.update(stacks)
+        self.requests += 1
+        if time() - self.started_at < self.window:
+            return None
+
+        started_at = datetime.fromtimestamp(self.started_at)
+        ended = (
+            f"window-{started_at:%Y%m%dT%H%M%S}-{self.requests}-requests",
+            self.stacks
+        )
+        self.stacks = Counter()
+        self.requests = 0
+        self.started_at = time()
+
+        return ended
+
+
+profile_window = ProfileWindow(PROFILE_WINDOW)
+# Requests of this worker, every `PROFILE_SAMPLE_RATE`-th one is sampled
+request_counter = count(1)
+
+
+async def profile_requests(
+    request: Request, call_next: Callable[[Request], Awaitable[Response]]
+) -> Response:
+    """Middleware that profiles requests of superusers on demand
+    and every `PROFILE_SAMPLE_RATE`-th request.
+
+    Superusers ask for a profile by `__profile=1` query parameter or
+    `X-Profile: 1` header and get its URL in `X-Profile` header. Others'
+    requests for profiles are ignored. Files are written in a thread
+    pool, not to block the event loop."""
+    requested = (
+        request.query_params.get("__profile") == "1"
+        or request.headers.get("X-Profile") == "1"
+    )
+    if requested:
+        principal = await get_request_principal(request)
+        requested = principal is not None and principal.is_superuser
+    sampled = (
+        PROFILE_SAMPLE_RATE > 0
+        and next(request_counter) % PROFILE_SAMPLE_RATE == 0
+    )
+    if not requested and not sampled:
+        return await call_next(request)
+
+    sampler = Sampler(threading.get_ident(), PROFILE_INTERVAL)
+    sampler.start()
+    try:
+        response = await call_next(request)
+    finally:
+        sampler.stop()
+
+    if requested:
+        path = UNSAFE.sub("_", request.url.path).strip("_") or "index"
+        name = (
+            f"{datetime.now():%Y%m%dT%H%M%S}-{request.method}-{path}-"
+            f"{uuid4().hex[:8]}"
+        )
+        await run_in_threadpool(write_profile, name, sampler.stacks)
+        response.headers["X-Profile"] = f"{router.prefix}/{name}.collapsed"
+    if sampled:
+        ended = profile_window.add(sampler.stacks)
+        if ended:
+            await run_in_threadpool(write_profile, *ended)
+
+    return response
+
+
+@router.get("/")
+def list_profiles() -> list[str]:
+    """Returns names of written profiles, the latest first."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+
+    names = [
+        entry for entry in os.listdir(PROFILE_DIR)
+        if PROFILE_NAME.fullmatch(entry)
+    ]
+
+    return sorted(
+        names, reverse=True,
+        key=lambda name: os.path.getmtime(os.path.join(PROFILE_DIR, name))
+    )
+
+
+@router.get("/{name}", response_class=FileResponse)
+def get_profile(name: str) -> FileResponse:
+    """Returns a profile in collapsed stacks format."""
+    path = os.path.join(PROFILE_DIR, name)
+    if not PROFILE_NAME.fullmatch(name) or not os.path.isfile(path):
+        raise HTTPException(HTTP_404_NOT_FOUND, "Profile not found")
+
+    return FileResponse(path, media_type="text/plain")
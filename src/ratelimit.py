@@ -0,0 +1,129 @@
+import sqlite3
+import time
+from collections import Counter
+
+import jwt
+from fastapi import Request
+from fastapi.responses import Response
+from limits.storage import Storage
+from slowapi import _rate_limit_exceeded_handler
+from slowapi.errors import RateLimitExceeded
+from slowapi.util import get_remote_address
+
+from signing import decode_token
+
+# Rejected requests by route
+rejected_requests: Counter[str] = Counter()
+
+
+class SQLiteStorage(Storage):
+    """Rate limit counters in a SQLite file, shared by all workers of a host.
+
+    Used by `sqlite:///path/to/file.db` storage URI. Every hit is one
+    atomic upsert, counters survive restarts of workers."""
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    # Expired counters are deleted every that many hits
+    CLEANUP_INTERVAL = 1000
+
+    def __init__(self, uri: str, **options) -> None:
+        super().__init__(uri, **options)
+        path = uri.removeprefix("sqlite:///")
+        self._hits = 0
+        self._conn = sqlite3.connect(
+            path, timeout=5, isolation_level=None, check_same_thread=False
+        )
+        # Losing counters of the last moments on a crash is fine
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = OFF")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS rate_limit (
+            key TEXT PRIMARY KEY, count INTEGER NOT NULL, expiry REAL NOT NULL
+        ) WITHOUT ROWID""")
+
+    @property
+    def base_exceptions(self) -> type[Exception]:
+        return sqlite3.Error
+
+    def _execute(self, sql: str, *params) -> tuple[tuple | None, int]:
+        """Executes a statement, returns its first row and rowcount."""
+        with self.lock:
+            cursor = self._conn.execute(sql, params)
+            return cursor.fetchone(), cursor.rowcount
+
+    def incr(
+        self, key: str, expiry: int, elastic_expiry: bool = False,
+        amount: int = 1
+    ) -> int:
+        now = time.time()
+        self._hits += 1
+        if self._hits % self.CLEANUP_INTERVAL == 0:
+            self._execute("DELETE FROM rate_limit WHERE expiry <= ?", now)
+
+        # Expired counter starts again, elastic expiry extends the window
+        row, _ = self._execute("""
+            INSERT INTO rate_limit (key, count, expiry) VALUES (?1, ?2, ?3)
+            ON CONFLICT (key) DO UPDATE SET
+                count = CASE WHEN expiry <= ?4 THEN ?2 ELSE count + ?2 END,
+                expiry = CASE WHEN expiry <= ?4 OR ?5 THEN ?3 ELSE expiry END
+            RETURNING count
+        """, key, amount, now + expiry, now, elastic_expiry)
+
+        return row[0]
+
+    def get(self, key: str) -> int:
+        row, _ = self._execute(
+            "SELECT count FROM rate_limit WHERE key = ? AND expiry > ?",
+            key, time.time()
+        )
+
+        return row[0] if row else 0
+
+    def get_expiry(self, key: str) -> int:
+        row, _ = self._execute(
+            "SELECT expiry FROM rate_limit WHERE key = ?", key
+        )
+
+        return int(row[0]) if row else int(time.time())
+
+    def check(self) -> bool:
+        try:
+            self._execute("SELECT 1")
+        except sqlite3.Error:
+            return False
+
+        return True
+
+    def reset(self) -> int | None:
+        _, count = self._execute("DELETE FROM rate_limit")
+
+        return count
+
+    def clear(self, key: str) -> None:
+        self._execute("DELETE FROM rate_limit WHERE key = ?", key)
+
+
+def user_or_ip_key(request: Request, secret_keys: list[str]) -> str:
+    """Rate limit key: id of the authenticated user or client IP address.
+
+    Token is only verified, not resolved, so this doesn't query
+    the database."""
+    token = request.cookies.get("fastapiusersauth")
+    if token:
+        try:
+            data = decode_token(token, secret_keys, ["fastapi-users:auth"])
+            return f"user:{data['sub']}"
+        except (jwt.PyJWTError, KeyError):
+            pass
+
+    return get_remote_address(request)
+
+
+def rate_limit_exceeded_handler(
+    request: Request, exc: RateLimitExceeded
+) -> Response:
+    """Counts a rejected request and responds with 429."""
+    route = request.scope.get("route")
+    rejected_requests[getattr(route, "path", request.url.path)] += 1
+
+    return _rate_limit_exceeded_handler(request, exc)
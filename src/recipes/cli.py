@@ -0,0 +1,176 @@
+"""Bulk import and export of recipes and users.
+
+Usage (from `src` folder):
+
+    python -m recipes.cli import recipes recipes.ndjson --batch-size 5000
+    python -m recipes.cli import users users.csv --skip 20000
+    python -m recipes.cli export recipes recipes.csv
+
+Files are NDJSON or CSV (by `.csv` extension or `--format` option),
+`-` means stdin/stdout. Import commits every batch in its own
+transaction, so after a failure it can be resumed with `--skip`.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import sys
+from datetime import datetime
+from itertools import islice
+from time import perf_counter
+from typing import Any, Iterator, TextIO
+
+from sqlalchemy import Table, insert, select
+
+from database import Recipe, User, async_session_maker
+from .utils import to_ndjson
+
+TABLES = {
+    "recipes": Recipe.__table__,
+    "users": User.__table__,
+}
+
+
+def read_rows(file: TextIO, format: str) -> Iterator[dict[str, Any]]:
+    """Yields rows of NDJSON or CSV file as dicts."""
+    if format == "csv":
+        yield from csv.DictReader(file)
+    else:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def coerce_row(
+    types: dict[str, type], row: dict[str, Any]
+) -> dict[str, Any]:
+    """Converts string values of the row to `types` of table columns.
+
+    Unknown keys are dropped, empty values become `None`."""
+    coerced = {}
+    for name, value in row.items():
+        python_type = types.get(name)
+        if python_type is None:
+            continue
+
+        if value == "" or value is None:
+            value = None
+        elif not isinstance(value, str) or python_type is str:
+            pass
+        elif python_type is bool:
+            value = value.lower() in ("1", "true")
+        elif python_type is datetime:
+            value = datetime.fromisoformat(value)
+        else:
+            value = python_type(value)
+
+        coerced[name] = value
+
+    return coerced
+
+
+def report(done: int, started_at: float) -> None:
+    """Prints a number of processed rows and speed to stderr."""
+    rate = done / max(perf_counter() - started_at, 1e-9)
+    print(f"{done} rows, {rate:.0f} rows/sec", file=sys.stderr)
+
+
+async def import_rows(
+    table: Table, rows: Iterator[dict[str, Any]],
+    batch_size: int = 5000, skip: int = 0
+) -> int:
+    """Inserts rows into the table, one transaction per batch.
+
+    First `skip` rows are skipped. Returns a number of inserted rows."""
+    rows = islice(rows, skip, None)
+    types = {column.name: column.type.python_type for column in table.columns}
+    done, started_at = 0, perf_counter()
+
+    async with async_session_maker() as session:
+        while batch := [
+            coerce_row(types, row) for row in islice(rows, batch_size)
+        ]:
+            try:
+                await session.execute(insert(table), batch)
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                print(
+                    f"Batch failed, resume with --skip {skip + done}",
+                    file=sys.stderr
+                )
+                raise
+
+            done += len(batch)
+            report(done, started_at)
+
+    return done
+
+
+async def export_rows(
+    table: Table, file: TextIO, format: str, batch_size: int = 5000
+) -> int:
+    """Writes all rows of the table to the file, ordered by id.
+
+    Returns a number of written rows."""
+    done, started_at = 0, perf_counter()
+    writer = None
+    if format == "csv":
+        writer = csv.DictWriter(file, fieldnames=table.columns.keys())
+        writer.writeheader()
+
+    async with async_session_maker() as session:
+        result = await session.stream(
+            select(table).order_by(table.c.id).execution_options(
+                yield_per=batch_size
+            )
+        )
+        async for rows in result.mappings().partitions():
+            for row in rows:
+                if writer:
+                    writer.writerow({
+                        name: value.isoformat()
+                        if isinstance(value, datetime) else value
+                        for name, value in row.items()
+                    })
+                else:
+                    file.write(to_ndjson(dict(row)).decode())
+
+            done += len(rows)
+            report(done, started_at)
+
+    return done
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("command", choices=("import", "export"))
+    parser.add_argument("table", choices=TABLES)
+    parser.add_argument("path", help="NDJSON or CSV file, - for stdio")
+    parser.add_argument("--format", choices=("ndjson", "csv"))
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument(
+        "--skip", type=int, default=0,
+        help="number of rows to skip, e.g. to resume failed import"
+    )
+    args = parser.parse_args()
+
+    format = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+    table = TABLES[args.table]
+
+    if args.command == "import":
+        file = sys.stdin if args.path == "-" else open(args.path, newline="")
+        with file:
+            asyncio.run(import_rows(
+                table, read_rows(file, format), args.batch_size, args.skip
+            ))
+    else:
+        file = sys.stdout if args.path == "-" else open(
+            args.path, "w", newline=""
+        )
+        with file:
+            asyncio.run(export_rows(table, file, format, args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""Generator of synthetic users and recipes for load testing.
+
+Usage (from `src` folder):
+
+    python -m recipes.generate --users 10000 --recipes 1000000
+    python -m recipes.generate --recipes 50000 --seed 7 --days 90
+
+Rows are appended with batched inserts in one transaction, on SQLite
+they go to the driver as preformatted tuples. Every generated user has
+the same password (`--password`), hashed once.
+Recipe authors follow Zipf's law: a few users write most of recipes.
+"""
+import argparse
+import asyncio
+import random
+import sys
+from datetime import datetime, timedelta
+from itertools import accumulate, islice
+from time import perf_counter
+from typing import Any, Callable, Iterator
+
+from fastapi_users.password import PasswordHelper
+from sqlalchemy import Table, func, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from database import (
+    RECIPE_FTS_DDL, RECIPE_STATS_DDL, Recipe, User, engine
+)
+from .cli import report
+
+WORDS = (
+    "tomato basil garlic onion pepper salt butter flour sugar egg milk "
+    "cream cheese lemon lime ginger chili rice noodle bean lentil potato "
+    "carrot celery mushroom spinach chicken beef pork tofu salmon shrimp "
+    "oven pan grill simmer roast bake fry boil stir whisk chop slice "
+    "marinate season serve fresh crispy tender spicy sweet sour smoky "
+    "with and until then add mix cook minutes heat pot bowl golden soft"
+).split()
+
+# Triggers of recipe inserts, that are replaced by one statement per
+# generated batch of rows, so indexing doesn't run row by row
+INSERT_TRIGGERS = {
+    "recipe_fts_insert": """INSERT INTO recipe_fts(rowid, headling, text)
+        SELECT id, headling, text FROM recipe WHERE id > :last_id""",
+    "recipe_stats_insert": """UPDATE recipe_stats
+        SET recipe_count = recipe_count + :count""",
+}
+
+# Memory for terms of recipes being indexed, before they are written
+# as a segment of the search index. Default 1 MiB writes many small
+# segments that are merged again, bulk indexing is ~1.5x faster with
+# 64 MiB
+FTS_HASHSIZE = """INSERT INTO recipe_fts(recipe_fts, rank)
+    VALUES ('hashsize', :size)"""
+FTS_DEFAULT_HASHSIZE = 1024 * 1024
+FTS_BULK_HASHSIZE = 64 * 1024 * 1024
+
+USER_COLUMNS = (
+    "username", "email", "hashed_password", "is_active", "is_superuser",
+    "is_verified",
+)
+RECIPE_COLUMNS = ("headling", "text", "author_id", "pub_date", "updated_at")
+
+
+def zipf_weights(n: int, s: float) -> list[float]:
+    """Returns cumulative weights of `n` ranks by Zipf's law."""
+    return list(accumulate(1 / rank ** s for rank in range(1, n + 1)))
+
+
+def sentences(rng: random.Random, n: int) -> list[str]:
+    """Returns `n` random sentences of 4-14 words."""
+    return [
+        " ".join(rng.choices(WORDS, k=rng.randint(4, 14))).capitalize() + "."
+        for _ in range(n)
+    ]
+
+
+def headlings(rng: random.Random, n: int) -> list[str]:
+    """Returns `n` random headlings of 10-50 characters."""
+    return [
+        " ".join(rng.choices(WORDS, k=rng.randint(2, 6))).capitalize()[
+            :50
+        ].ljust(10, ".")
+        for _ in range(n)
+    ]
+
+
+def sqlite_timestamp(value: datetime) -> str:
+    """Formats a datetime as SQLAlchemy stores it in SQLite."""
+    return value.isoformat(" ", "microseconds")
+
+
+def user_rows(
+    start: int, count: int, hashed_password: str, prefix: str
+) -> Iterator[tuple]:
+    """Yields rows of `USER_COLUMNS`."""
+    for i in range(start, start + count):
+        yield (
+            f"{prefix}{i}", f"{prefix}{i}@example.com", hashed_password,
+            True, False, True,
+        )
+
+
+def recipe_rows(
+    rng: random.Random, count: int, author_ids: list[int],
+    days: float, zipf: float,
+    timestamp: Callable[[datetime], Any] | None = None
+) -> Iterator[tuple]:
+    """Yields rows of `RECIPE_COLUMNS`, dates are formatted
+    by `timestamp` if it's passed."""
+    # Texts are runs of a pool of random sentences, that's much faster
+    # than picking every word or sentence, and full-text search still has
+    # common and rare combinations of words
+    sentence_pool = sentences(rng, 50_000)
+    headling_pool = headlings(rng, 10_000)
+    # Shuffled, so the most active authors aren't the oldest users
+    author_ids = rng.sample(author_ids, len(author_ids))
+    weights = zipf_weights(len(author_ids), zipf)
+    now = datetime.utcnow()
+    span = timedelta(days=days).total_seconds()
+    # Bound once, the loop runs millions of times. `int(random() * n)`
+    # is several times faster than `choice` and `randrange`
+    random_, lognormvariate = rng.random, rng.lognormvariate
+
+    for i in range(count):
+        if i % 10_000 == 0:
+            # Picked in bulk, one `choices` per row is much slower
+            authors = iter(rng.choices(
+                author_ids, cum_weights=weights, k=min(10_000, count - i)
+            ))
+
+        # Mostly around 8 sentences (70 words), rarely very long
+        n = min(max(int(lognormvariate(2.0, 0.6)), 1), 200)
+        # More recipes in recent days, like on a growing site
+        pub_date = now - timedelta(seconds=span * random_() ** 2)
+        updated_at = pub_date
+        if random_() < 0.1:
+            updated_at = min(
+                pub_date + timedelta(seconds=random_() * span / 10), now
+            )
+
+        if timestamp:
+            # Most recipes weren't updated, their dates are formatted once
+            formatted = timestamp(pub_date)
+            if updated_at is not pub_date:
+                updated_at = timestamp(updated_at)
+            else:
+                updated_at = formatted
+            pub_date = formatted
+
+        start = int(random_() * (len(sentence_pool) - n))
+        yield (
+            headling_pool[int(random_() * len(headling_pool))],
+            " ".join(sentence_pool[start:start + n]),
+            next(authors), pub_date, updated_at,
+        )
+
+
+async def insert_batches(
+    conn: AsyncConnection, table: Table, columns: tuple[str, ...],
+    rows: Iterator[tuple], batch_size: int
+) -> int:
+    """Inserts rows of `columns` in batches, returns a number of inserted
+    rows.
+
+    On SQLite rows are passed to the driver as they are, SQLAlchemy's
+    processing of every value took longer than the inserts."""
+    if conn.dialect.name == "sqlite":
+        statement = (
+            f"INSERT INTO {table.name} ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * len(columns))})"
+        )
+
+        async def execute(batch: list[tuple]) -> None:
+            await conn.exec_driver_sql(statement, batch)
+    else:
+        async def execute(batch: list[tuple]) -> None:
+            await conn.execute(
+                insert(table), [dict(zip(columns, row)) for row in batch]
+            )
+
+    done, started_at = 0, perf_counter()
+    while batch := list(islice(rows, batch_size)):
+        await execute(batch)
+        done += len(batch)
+        report(done, started_at)
+
+    return done
+
+
+async def generate_users(
+    conn: AsyncConnection, count: int, password: str = "test1234",
+    prefix: str = "user", batch_size: int = 20_000
+) -> int:
+    """Inserts `count` users, returns a number of inserted users."""
+    hashed_password = PasswordHelper().hash(password)
+    start = (await conn.scalar(select(func.max(User.id))) or 0) + 1
+
+    return await insert_batches(
+        conn, User.__table__, USER_COLUMNS,
+        user_rows(start, count, hashed_password, prefix), batch_size
+    )
+
+
+async def generate_recipes(
+    conn: AsyncConnection, rng: random.Random, count: int,
+    days: float = 3 * 365, zipf: float = 1.1, batch_size: int = 20_000
+) -> int:
+    """Inserts `count` recipes by existing users, returns a number
+    of inserted recipes."""
+    author_ids = list(await conn.scalars(select(User.id).order_by(User.id)))
+    if not author_ids and count:
+        raise ValueError("There are no users to be authors of recipes")
+
+    sqlite = conn.dialect.name == "sqlite"
+    indexes = []
+    if sqlite:
+        last_id = await conn.scalar(select(func.max(Recipe.id))) or 0
+        for name in INSERT_TRIGGERS:
+            await conn.execute(text(f"DROP TRIGGER {name}"))
+        # Building an index after the inserts is faster than updating it
+        # row by row, unless the table already has more rows than added
+        if count > last_id:
+            indexes = list(Recipe.__table__.indexes)
+        for index in indexes:
+            await conn.run_sync(index.drop)
+
+    done = await insert_batches(
+        conn, Recipe.__table__, RECIPE_COLUMNS,
+        recipe_rows(
+            rng, count, author_ids, days, zipf,
+            sqlite_timestamp if sqlite else None
+        ),
+        batch_size
+    )
+
+    for index in indexes:
+        await conn.run_sync(index.create)
+    if sqlite:
+        await conn.execute(text(FTS_HASHSIZE), {"size": FTS_BULK_HASHSIZE})
+        for name, statement in INSERT_TRIGGERS.items():
+            await conn.execute(
+                text(statement), {"last_id": last_id, "count": done}
+            )
+            ddl = next(
+                ddl for ddl in RECIPE_FTS_DDL + RECIPE_STATS_DDL
+                if f"TRIGGER {name} " in ddl
+            )
+            await conn.execute(text(ddl))
+        await conn.execute(
+            text(FTS_HASHSIZE), {"size": FTS_DEFAULT_HASHSIZE}
+        )
+
+    return done
+
+
+async def generate(
+    users: int, recipes: int, seed: int | None = None,
+    engine: AsyncEngine = engine, **options
+) -> tuple[int, int]:
+    """Inserts users and recipes in one transaction, so other connections
+    never see recipes without search index.
+
+    `engine` is the app's database by default. `options` are passed to `generate_users` and `generate_recipes`.
+    Returns numbers of inserted users and recipes."""
+    rng = random.Random(seed)
+    user_options = {
+        key: options[key] for key in ("password", "prefix", "batch_size")
+        if key in options
+    }
+    recipe_options = {
+        key: options[key] for key in ("days", "zipf", "batch_size")
+        if key in options
+    }
+
+    async with engine.begin() as conn:
+        users = await generate_users(conn, users, **user_options)
+        recipes = await generate_recipes(conn, rng, recipes, **recipe_options)
+
+    return users, recipes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--users", type=int, default=0)
+    parser.add_argument("--recipes", type=int, default=0)
+    parser.add_argument("--seed", type=int, help="seed of random generator")
+    parser.add_argument("--password", default="test1234")
+    parser.add_argument(
+        "--prefix", default="user", help="prefix of usernames and emails"
+    )
+    parser.add_argument(
+        "--days", type=float, default=3 * 365,
+        help="recipes are published during that many last days"
+    )
+    parser.add_argument(
+        "--zipf", type=float, default=1.1,
+        help="exponent of authors' Zipf distribution, 0 for uniform"
+    )
+    parser.add_argument("--batch-size", type=int, default=20_000)
+    args = parser.parse_args()
+
+    started_at = perf_counter()
+    users, recipes = asyncio.run(generate(
+        args.users, args.recipes, args.seed, password=args.password,
+        prefix=args.prefix, days=args.days, zipf=args.zipf,
+        batch_size=args.batch_size
+    ))
+    print(
+        f"{users} users and {recipes} recipes are generated in "
+        f"{perf_counter() - started_at:.1f} sec",
+        file=sys.stderr
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,52 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from typing import AsyncGenerator, Hashable
+import zlib
+
+from fastapi import (
+    APIRouter, Depends, HTTPException, Query, Request, Response
+)
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from starlette.status import (
-    HTTP_201_CREATED, HTTP_403_FORBIDDEN, HTTP_404_NOT_FOUND
+    HTTP_201_CREATED, HTTP_403_FORBIDDEN,
+    HTTP_404_NOT_FOUND, HTTP_413_REQUEST_ENTITY_TOO_LARGE
+)
+from sqlalchemy import (
+    ColumnElement, Float, Row, Select, func, insert, literal_column, select,
+    tuple_, update
 )
-from sqlalchemy import func, select, update
-from sqlalchemy.exc import NoResultFound
 from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
 from math import ceil
-from random import randint
 
 from auth.auth_config import current_user
-from database import get_async_session, Recipe, User
-from config import limiter
-from .schemas import RecipeCreate, RecipeResponse
-from .utils import recipe_response, get_recipe_by_id
+from base_utils import check_not_modified, make_etag
+from auth.schemas import Principal
+from cache import LRUCache, MISSING, recipes_version
+from database import (
+    get_async_session, get_read_session, get_read_session_maker,
+    Recipe, User, recipe_fts, recipe_stats
+)
+from config import (
+    limiter, BULK_MAX_RECIPES, EXPORT_BATCH_SIZE, COUNT_CACHE_SIZE,
+    COUNT_CACHE_TTL
+)
+from .sampling import recipe_ids
+from .schemas import BulkRecipeResult, RecipeCreate, RecipeResponse
+from .utils import (
+    recipe_response, recipe_list_response, select_recipe_list,
+    get_recipe_by_id, encode_cursor, decode_cursor, to_fts_query,
+    recipes_etag, parse_bulk_body, format_validation_errors, to_ndjson,
+    SNIPPET_START, SNIPPET_END
+)
 
 router = APIRouter(
     prefix="/api/recipes",
     tags=["API"],
 )
 
+# Numbers of recipes in filtered lists
+recipe_counts = LRUCache(COUNT_CACHE_SIZE, COUNT_CACHE_TTL)
+
 
 async def _create_recipe(
     session: AsyncSession, headling: str, text: str, author_id: int
@@ -32,8 +60,11 @@ async def _create_recipe(
 
     session.add(recipe)
     await session.commit()
+    recipe_ids.add(recipe.id)
+    recipes_version.bump()
 
-    return recipe
+    # Author isn't in the session, authentication loads only `Principal`
+    return await get_recipe_by_id(session, recipe.id)
 
 
 @router.post("/", status_code=HTTP_201_CREATED, response_model=RecipeResponse)
@@ -41,7 +72,7 @@ async def _create_recipe(
 async def create_recipe(
     request: Request, new_recipe: RecipeCreate,
     session: AsyncSession = Depends(get_async_session),
-    user: User = Depends(current_user)
+    user: Principal = Depends(current_user)
 ) -> RecipeResponse:
     """Creates a new recipe."""
     recipe = await _create_recipe(
@@ -51,93 +82,310 @@ async def create_recipe(
     return recipe_response(recipe)
 
 
+async def _create_recipes(
+    session: AsyncSession, recipes: list[RecipeCreate], author_id: int
+) -> list[int]:
+    """Sub-function for `create_recipes`.
+
+    Inserts all recipes in batches in one transaction, returns their ids."""
+    if not recipes:
+        return []
+
+    now = datetime.utcnow()
+    stmt = insert(Recipe).returning(Recipe.id, sort_by_parameter_order=True)
+    result = await session.scalars(stmt, [
+        {
+            "headling": recipe.headling, "text": recipe.text,
+            "author_id": author_id, "pub_date": now, "updated_at": now,
+        } for recipe in recipes
+    ])
+    ids = result.all()
+    await session.commit()
+
+    for id in ids:
+        recipe_ids.add(id)
+    recipes_version.bump()
+
+    return ids
+
+
+@router.post("/bulk", response_model=list[BulkRecipeResult])
+@limiter.limit("5/minute")
+async def create_recipes(
+    request: Request, session: AsyncSession = Depends(get_async_session),
+    user: Principal = Depends(current_user)
+) -> list[BulkRecipeResult]:
+    """Creates many recipes at once.
+
+    Accepts a JSON array of recipes or NDJSON (`application/x-ndjson`)
+    with a recipe on every line, up to `BULK_MAX_RECIPES` recipes.
+    Valid recipes are created in one transaction, invalid ones are skipped.
+
+    Returns an id or validation errors for every passed recipe."""
+    items = parse_bulk_body(
+        await request.body(), request.headers.get("content-type", "")
+    )
+    if len(items) > BULK_MAX_RECIPES:
+        raise HTTPException(
+            HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            f"Too many recipes (more than {BULK_MAX_RECIPES})"
+        )
+
+    results, recipes = [], []
+    for index, item in enumerate(items):
+        try:
+            recipes.append(RecipeCreate.model_validate(item))
+        except ValidationError as e:
+            results.append(BulkRecipeResult(
+                index=index, errors=format_validation_errors(e)
+            ))
+        else:
+            results.append(BulkRecipeResult(index=index))
+
+    ids = iter(await _create_recipes(session, recipes, user.id))
+    for result in results:
+        if not result.errors:
+            result.id = next(ids)
+
+    return results
+
+
+async def _count_recipes(
+    session: AsyncSession, stmt: Select, count_key: Hashable | None = None
+) -> int:
+    """Returns number of recipes matching `stmt`.
+
+    `count_key` identifies filters of `stmt`, `None` means that `stmt`
+    selects all recipes, their number is read from `recipe_stats` table.
+    Other numbers are counted once and cached until the next write."""
+    if count_key is None:
+        return await session.scalar(select(recipe_stats.c.recipe_count))
+
+    key = (recipes_version.value, count_key)
+    total = recipe_counts.get(key)
+    if total is MISSING:
+        total = await session.scalar(
+            select(func.count()).select_from(stmt.subquery())
+        )
+        recipe_counts.set(key, total)
+
+    return total
+
+
+def _page_query(
+    stmt: Select, page: int = 1, size: int = 12, cursor: str | None = None,
+    sort_key: ColumnElement = Recipe.pub_date
+) -> Select:
+    """Returns `stmt` sorted by `sort_key` and limited to a page
+    (see `_paginate`), with one extra row that tells whether there
+    is a next page."""
+    stmt = stmt.add_columns(sort_key.label("sort_key")).order_by(
+        sort_key.desc(), Recipe.id.desc()
+    )
+    if cursor:
+        key, last_id = decode_cursor(cursor, sort_key.type.python_type)
+        stmt = stmt.where(
+            tuple_(sort_key, Recipe.id) < tuple_(key, last_id)
+        )
+    else:
+        stmt = stmt.offset((page - 1) * size)
+
+    return stmt.limit(size + 1)
+
+
+async def _paginate(
+    session: AsyncSession, stmt: Select, page: int = 1, size: int = 12,
+    cursor: str | None = None, sort_key: ColumnElement = Recipe.pub_date,
+    count_key: Hashable | None = None, count: bool = True
+) -> tuple[list[Row], dict[str, int | str | bool | None]]:
+    """Sends a page of recipes matching `stmt` to the database.
+
+    Recipes are sorted by `sort_key` (the latest first by default).
+    If `cursor` is passed, the page starts right after the recipe
+    it points to (keyset pagination), otherwise `page` is used as offset.
+    Recipes are counted by `_count_recipes` with `count_key`, or
+    aren't counted at all if `count` is false (`total` is `None` then).
+
+    Returns rows of the page (with `id` column) and paginator."""
+    total = None
+    if count:
+        total = await _count_recipes(session, stmt, count_key)
+
+    result = await session.execute(
+        _page_query(stmt, page, size, cursor, sort_key)
+    )
+    rows = result.all()
+
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        next_cursor = encode_cursor(rows[-1].sort_key, rows[-1].id)
+
+    paginator = {
+        "page": page,
+        "size": size,
+        "total": ceil(total / size) if count else None,
+        "has_next": next_cursor is not None,
+        "next_cursor": next_cursor,
+    }
+
+    return rows, paginator
+
+
 async def _get_recipes(
     session: AsyncSession,
     search_query: str | None = None, id: int | None = None,
     random: bool = False,
-    page: int = 1, size: int = 12
-) -> HTTPException | RecipeResponse | list[dict[str, int] | RecipeResponse]:
-    """Sub-function for `get_recipes`."""
+    page: int = 1, size: int = 12, cursor: str | None = None,
+    author: str | None = None, count: bool = True,
+    request: Request | None = None, response: Response | None = None
+) -> HTTPException | RecipeResponse | list[dict[str, int | str | None] | RecipeResponse]:
+    """Sub-function for `get_recipes`.
+
+    If `request` and `response` are passed, validators of the result
+    are set to the response and 304 is raised if the request has matching
+    conditional headers. They are checked before rendering of the result."""
+    # Recipes of one author are loaded only when they are asked for,
+    # lists have their author joined
+    filters = []
+    if author:
+        filters.append(User.username == author)
+
     # Search
     if search_query:
-        stmt = select(Recipe).filter(
-            Recipe.headling.like(f"%{search_query}%")
+        fts_query = to_fts_query(search_query)
+        # Lower bm25 is a better match, headling matches weigh more
+        rank = -func.bm25(literal_column("recipe_fts"), 10.0, 1.0, type_=Float)
+        snippet = func.snippet(
+            literal_column("recipe_fts"), -1,
+            SNIPPET_START, SNIPPET_END, "...", 16
+        )
+        stmt = select_recipe_list(snippet.label("snippet")).join(
+            recipe_fts, recipe_fts.c.rowid == Recipe.id
+        ).where(
+            literal_column("recipe_fts").op("MATCH")(fts_query), *filters
         )
-        result = await session.execute(stmt)
-        recipes = result.scalars().all()
 
-        if not recipes:
+        rows, paginator = [], {"total": 0}
+        if fts_query:
+            rows, paginator = await _paginate(
+                session, stmt, page, size, cursor, sort_key=rank,
+                count_key=("search", fts_query, author), count=count
+            )
+
+        if not rows and not paginator["total"]:
             raise HTTPException(
                 HTTP_404_NOT_FOUND,
                 f"Recipes for query '{search_query}' not found"
             )
+
+        if request:
+            etag = recipes_etag(rows, paginator, search_query, author)
+            check_not_modified(request, response, etag)
+
+        result = [
+            recipe_list_response(row, row.snippet).model_dump(mode="json")
+            for row in rows
+        ]
+
+        return result + [paginator]
     
     # Searching a recipe with passed id
     elif id:
         recipe = await get_recipe_by_id(session, id)
 
+        if recipe and request:
+            check_not_modified(
+                request, response, make_etag(recipe.id, recipe.updated_at),
+                recipe.updated_at or recipe.pub_date
+            )
+
         return recipe_response(recipe, full_text=True)
 
     # Random recipe
     elif random:
-        count = await session.scalar(select(func.count(Recipe.id)))
-
-        while True:
-            random_id = randint(1, count)
-            stmt = select(Recipe).filter_by(id=random_id)
-            result = await session.execute(stmt)
-            try:
-                recipe = result.scalar_one()
-            except NoResultFound:
-                continue
+        recipes = await _get_random_recipes(session)
 
-            if not recipe:
-                continue
-
-            return recipe_response(recipe)
+        return recipes[0]
 
     # Latest recipes
     else:
-        stmt = select(Recipe).order_by(Recipe.pub_date.desc())
-        result = await session.execute(stmt)
-        recipes = result.scalars().all()
+        rows, paginator = await _paginate(
+            session, select_recipe_list().where(*filters), page, size, cursor,
+            count_key=("author", author) if author else None, count=count
+        )
 
-        if not recipes:
+        if not rows and not paginator["total"]:
             raise HTTPException(HTTP_404_NOT_FOUND, "Recipes not found")
 
+        if request:
+            etag = recipes_etag(rows, paginator, author)
+            check_not_modified(request, response, etag)
+
     # Formatting a result
-    formatted_result = [
-        recipe_response(recipe).model_dump(mode="json") for recipe in recipes
+    result = [
+        recipe_list_response(row).model_dump(mode="json") for row in rows
     ]
 
-    # Pagination and slicing
-    offset_min = (page - 1) * size
-    offset_max = page * size
+    return result + [paginator]
 
-    response = formatted_result[offset_min:offset_max] + [
-        {
-            "page": page,
-            "size": size,
-            "total": ceil(len(recipes) / size),
-        }
-    ]
 
-    return response
+async def _get_random_recipes(
+    session: AsyncSession, n: int = 1
+) -> list[RecipeResponse]:
+    """Sub-function for `get_random_recipes`.
+
+    Returns up to `n` distinct random recipes."""
+    recipes = []
+    # Other workers could delete some of the sampled recipes, in this case
+    # they are dropped from the pool and the sample is taken again
+    for _ in range(3):
+        ids = await recipe_ids.sample(session, n)
+        result = await session.execute(
+            select_recipe_list().where(Recipe.id.in_(ids))
+        )
+        found = {row.id: row for row in result}
+        recipes = [found[id] for id in ids if id in found]
+
+        if len(recipes) == len(ids):
+            break
+
+        for id in ids:
+            if id not in found:
+                recipe_ids.discard(id)
+
+    if not recipes:
+        raise HTTPException(HTTP_404_NOT_FOUND, "Recipes not found")
+
+    return [recipe_list_response(row) for row in recipes]
+
+
+@router.get("/random", response_model=list[RecipeResponse])
+@limiter.limit("30/minute")
+async def get_random_recipes(
+    request: Request, n: int = Query(ge=1, le=30, default=1),
+    session: AsyncSession = Depends(get_read_session)
+) -> list[RecipeResponse]:
+    """Returns `n` distinct random recipes."""
+    return await _get_random_recipes(session, n)
 
 
 @router.get("/", response_model=None)
 @limiter.limit("30/minute")
 async def get_recipes(
-    request: Request, search_query: str | None = None, id: int | None = None,
+    request: Request, response: Response,
+    search_query: str | None = None, id: int | None = None,
     random: bool = False,
     page: int = 1, size: int = Query(ge=1, le=30, default=12),
-    session: AsyncSession = Depends(get_async_session)
-) -> HTTPException | RecipeResponse | list[dict[str, int] | RecipeResponse]:
+    cursor: str | None = None, author: str | None = None,
+    count: bool = True, session: AsyncSession = Depends(get_read_session)
+) -> HTTPException | RecipeResponse | list[dict[str, int | str | None] | RecipeResponse]:
     """Returns a latest recipes if no params are passed.
 
     :param `search_query`:
 
-    Returns results of search on this query.
+    Returns results of full-text search on this query, the best matches
+    first. Every result has a `snippet` with highlighted matches.
 
     :param `id`:
 
@@ -147,20 +395,101 @@ async def get_recipes(
 
     Returns a random recipe, default value is `False`. Makes sense, right?
 
+    :param `cursor`:
+
+    Returns a page that starts right after the recipe this cursor points to.
+    Cursor of the next page is returned in paginator as `next_cursor`.
+
+    :param `author`:
+
+    Returns only recipes of the user with this username.
+    Works for latest recipes and search.
+
+    :param `count`:
+
+    Counts pages of latest recipes and search results, default value
+    is `True`. If `False`, paginator has `total` set to `null`,
+    use `has_next` to know whether there is a next page.
+
     Endpoint can accept only one of this arguments. 
     For example, if you pass `search_query` and `random=True`,
     you'll get only results of search.
 
+    Latest recipes, search results and a recipe by id have `ETag`
+    (and `Last-Modified` for a recipe by id), so conditional requests
+    get 304 response without body if recipes haven't changed.
+
     """
-    response = await _get_recipes(
-        session, search_query, id, random, page, size
+    return await _get_recipes(
+        session, search_query, id, random, page, size, cursor, author,
+        count, request=request, response=response
     )
 
-    return response
+
+async def _export_recipes(
+    since: datetime | None = None, since_id: int | None = None,
+    compress: bool = False
+) -> AsyncGenerator[bytes, None]:
+    """Sub-function for `export_recipes`.
+
+    Yields recipes as NDJSON, fetching `EXPORT_BATCH_SIZE` rows at once
+    through a server-side cursor."""
+    stmt = select(
+        Recipe.id, Recipe.headling, Recipe.text, Recipe.pub_date,
+        Recipe.updated_at, User.username.label("author")
+    ).join(User, Recipe.author_id == User.id).order_by(Recipe.id)
+    if since:
+        stmt = stmt.where(Recipe.updated_at >= since)
+    if since_id:
+        stmt = stmt.where(Recipe.id > since_id)
+
+    # wbits=31 makes a gzip stream
+    compressor = zlib.compressobj(wbits=31) if compress else None
+
+    # Own session, because the response outlives the route
+    async with get_read_session_maker()() as session:
+        result = await session.stream(
+            stmt.execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        async for rows in result.mappings().partitions():
+            chunk = b"".join(to_ndjson(dict(row)) for row in rows)
+            yield compressor.compress(chunk) if compressor else chunk
+
+    if compressor:
+        yield compressor.flush()
+
+
+@router.get("/export", response_class=StreamingResponse)
+@limiter.limit("5/minute")
+async def export_recipes(
+    request: Request, since: datetime | None = None,
+    since_id: int | None = None, compress: bool = False
+) -> StreamingResponse:
+    """Streams all recipes as NDJSON, ordered by id.
+
+    :param `since`:
+
+    Returns only recipes created or updated since this time (UTC).
+
+    :param `since_id`:
+
+    Returns only recipes with bigger id, e.g. to resume an export.
+
+    :param `compress`:
+
+    Compresses the response with gzip, default value is `False`.
+
+    """
+    headers = {"Content-Encoding": "gzip"} if compress else None
+
+    return StreamingResponse(
+        _export_recipes(since, since_id, compress),
+        media_type="application/x-ndjson", headers=headers
+    )
 
 
 async def _update_recipe(
-    session: AsyncSession, user: User,
+    session: AsyncSession, user: Principal,
     id: int, updated_recipe: RecipeCreate
 ) -> Recipe | None:
     """Sub-function for `update_recipe`.
@@ -174,13 +503,17 @@ async def _update_recipe(
             HTTP_403_FORBIDDEN, "You aren't an author of this recipe"
         )
 
+    # Explicit `updated_at`, so session sync applies it to the recipe
+    # in the identity map, SQL-side `onupdate` wouldn't
     stmt = update(Recipe).where(Recipe.id == id).values(
         headling=updated_recipe.headling,
-        text=updated_recipe.text
+        text=updated_recipe.text,
+        updated_at=datetime.utcnow()
     )
 
     await session.execute(stmt)
     await session.commit()
+    recipes_version.bump()
 
     return await get_recipe_by_id(session, id)
 
@@ -190,7 +523,7 @@ async def _update_recipe(
 async def update_recipe(
     request: Request, id: int, updated_recipe: RecipeCreate, 
     session: AsyncSession = Depends(get_async_session), 
-    user: User = Depends(current_user)
+    user: Principal = Depends(current_user)
 ) -> RecipeResponse:
     """Updating recipe with passed id."""
     new_recipe = await _update_recipe(session, user, id, updated_recipe)
@@ -198,7 +531,7 @@ async def update_recipe(
     return recipe_response(new_recipe)
 
 
-async def _delete_recipe(session: AsyncSession, user: User, id: int) -> None:
+async def _delete_recipe(session: AsyncSession, user: Principal, id: int) -> None:
     """Sub-function for `delete_recipe`."""
     recipe = await get_recipe_by_id(session, id)
 
@@ -211,12 +544,14 @@ async def _delete_recipe(session: AsyncSession, user: User, id: int) -> None:
 
     await session.delete(recipe)
     await session.commit()
+    recipe_ids.discard(id)
+    recipes_version.bump()
 
 
 @router.delete("/", response_model=dict[str, str])
 @limiter.limit("30/minute")
 async def delete_recipe(
-    request: Request, id: int, user: User = Depends(current_user),
+    request: Request, id: int, user: Principal = Depends(current_user),
     session: AsyncSession = Depends(get_async_session)
 ) -> dict[str, str]:
     """Deletes a recipe with passed id."""
@@ -0,0 +1,98 @@
+import asyncio
+from array import array
+from bisect import bisect_left
+from random import sample
+from time import monotonic
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from config import RANDOM_POOL_TTL
+from database import Recipe
+
+
+class RecipeIdPool:
+    """Sorted array of live recipe ids to pick random recipes from.
+
+    It's loaded with a single `SELECT id` on first use and kept up to date
+    by writes of this process. To pick up writes of other workers, it's
+    reloaded every `ttl` seconds by a background task, requests are served
+    from the old ids meanwhile, so none of them waits for the reload."""
+
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        self._ids: array | None = None
+        self._loaded_at = 0.0
+        self._reload: asyncio.Task | None = None
+        # Writes of this process during a reload, replayed after it,
+        # because its `SELECT` could miss them
+        self._changes: list[tuple[int, bool]] | None = None
+
+    async def load(self, session: AsyncSession) -> None:
+        """Loads ids of all recipes from the database."""
+        result = await session.scalars(select(Recipe.id).order_by(Recipe.id))
+        self._ids = array("q", result)
+        self._loaded_at = monotonic()
+
+    async def _reload_in_background(self, engine: AsyncEngine) -> None:
+        """Reloads ids in its own session, a request's one is closed
+        before the reload ends."""
+        try:
+            async with AsyncSession(engine) as session:
+                await self.load(session)
+
+            changes, self._changes = self._changes, None
+            for id, added in changes:
+                if added:
+                    self.add(id)
+                else:
+                    self.discard(id)
+        finally:
+            self._changes = None
+            self._reload = None
+
+    async def sample(self, session: AsyncSession, k: int = 1) -> list[int]:
+        """Returns up to `k` distinct random recipe ids."""
+        if self._ids is None:
+            await self.load(session)
+        elif (
+            monotonic() - self._loaded_at > self.ttl and self._reload is None
+        ):
+            self._changes = []
+            self._reload = asyncio.create_task(
+                self._reload_in_background(session.bind)
+            )
+
+        k = min(k, len(self._ids))
+
+        return [self._ids[i] for i in sample(range(len(self._ids)), k)]
+
+    def add(self, id: int) -> None:
+        """Adds an id of created recipe."""
+        if self._ids is None:
+            return
+        if self._changes is not None:
+            self._changes.append((id, True))
+
+        # New ids are almost always the biggest ones
+        if not self._ids or id > self._ids[-1]:
+            self._ids.append(id)
+            return
+
+        i = bisect_left(self._ids, id)
+        if self._ids[i] != id:
+            self._ids.insert(i, id)
+
+    def discard(self, id: int) -> None:
+        """Removes an id of deleted recipe."""
+        if self._ids is None:
+            return
+        if self._changes is not None:
+            self._changes.append((id, False))
+
+        i = bisect_left(self._ids, id)
+        if i < len(self._ids) and self._ids[i] == id:
+            del self._ids[i]
+
+
+recipe_ids = RecipeIdPool(ttl=RANDOM_POOL_TTL)
@@ -12,4 +12,13 @@ class RecipeResponse(BaseModel):
     headling: str
     text: str
     pub_date: datetime
+    updated_at: datetime | None = None
     author: str
+    snippet: str | None = None
+
+
+class BulkRecipeResult(BaseModel):
+    """Result of one item of bulk creation: id or validation errors."""
+    index: int
+    id: int | None = None
+    errors: list[str] | None = None
@@ -1,10 +1,32 @@
+import json
+import re
+from typing import Any
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
 from fastapi import HTTPException
-from sqlalchemy import select
+from markupsafe import escape
+from pydantic import ValidationError
+from starlette.status import HTTP_400_BAD_REQUEST
+from sqlalchemy import Row, Select, func, select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import contains_eager
 
-from database import Recipe
+from base_utils import make_etag
+from database import Recipe, User
 from .schemas import RecipeResponse
 
+# Number of characters of recipe text shown in lists
+EXCERPT_LEN = 110
+
+# Columns of recipes in lists. Text is cut by the database, one extra
+# character tells whether the excerpt needs "...". Author is joined
+RECIPE_LIST_COLUMNS = (
+    Recipe.id, Recipe.headling,
+    func.substr(Recipe.text, 1, EXCERPT_LEN + 1).label("text"),
+    Recipe.pub_date, Recipe.updated_at, User.username.label("author"),
+)
+
 
 async def validate_recipe_fields(
     headling: str, text: str, errors: list
@@ -22,6 +44,22 @@ async def validate_recipe_fields(
         errors.append("Text is too short (less than 10 characters)")
 
 
+def excerpt(text: str) -> str:
+    """Cuts a recipe text to `EXCERPT_LEN` characters for lists."""
+    if len(text) > EXCERPT_LEN:
+        return f"{text[:EXCERPT_LEN]}..."
+
+    return text
+
+
+def select_recipe_list(*columns: Any) -> Select:
+    """Returns a select of `RECIPE_LIST_COLUMNS` (and `columns`) with
+    author joined."""
+    return select(*RECIPE_LIST_COLUMNS, *columns).join(
+        User, Recipe.author_id == User.id
+    )
+
+
 def recipe_response(
     recipe: Recipe, full_text: bool = False
 ) -> RecipeResponse:
@@ -29,26 +67,128 @@ def recipe_response(
     if not recipe:
         raise HTTPException(404, "Recipe not found")
 
-    max_text_len = 110
+    return RecipeResponse(
+        id=recipe.id, headling=recipe.headling,
+        text=recipe.text if full_text else excerpt(recipe.text),
+        pub_date=recipe.pub_date, updated_at=recipe.updated_at,
+        author=recipe.author.username
+    )
 
-    if full_text or len(recipe.text) < max_text_len:
-        return RecipeResponse(
-            id=recipe.id, headling=recipe.headling, text=recipe.text,
-            pub_date=recipe.pub_date, author=recipe.author.username
-        )
-    elif len(recipe.text) > max_text_len:
-        return RecipeResponse(
-            id=recipe.id, headling=recipe.headling,
-            text=f"{recipe.text[:max_text_len]}...",
-            pub_date=recipe.pub_date,
-            author=recipe.author.username
-        )
+
+def recipe_list_response(
+    row: Row, snippet: str | None = None
+) -> RecipeResponse:
+    """Creating an `RecipeResponse` instance with a row selected
+    by `select_recipe_list`."""
+    return RecipeResponse(
+        id=row.id, headling=row.headling, text=excerpt(row.text),
+        pub_date=row.pub_date, updated_at=row.updated_at, author=row.author,
+        snippet=highlight_snippet(snippet) if snippet else None
+    )
 
 
 async def get_recipe_by_id(session: AsyncSession, id: int) -> Recipe | None:
-    """Getting recipe with passed id."""
-    stmt = select(Recipe).where(Recipe.id == id)
+    """Getting recipe with passed id and its author in one query."""
+    stmt = select(Recipe).join(Recipe.author).options(
+        contains_eager(Recipe.author)
+    ).where(Recipe.id == id)
     result = await session.execute(stmt)
     recipe = result.scalars().first()
 
     return recipe
+
+
+def encode_cursor(key: datetime | float, id: int) -> str:
+    """Encodes a position in a recipes list to an opaque cursor.
+
+    `key` is a value the list is sorted by, e.g. `pub_date` or search rank."""
+    key = key.isoformat() if isinstance(key, datetime) else repr(key)
+    raw = f"{key}|{id}".encode()
+
+    return urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(
+    cursor: str, key_type: type = datetime
+) -> tuple[datetime | float, int]:
+    """Decodes a cursor made by `encode_cursor` to `(key, id)` pair."""
+    try:
+        raw = urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        key, id = raw.split("|")
+        if key_type is datetime:
+            return datetime.fromisoformat(key), int(id)
+
+        return key_type(key), int(id)
+    except ValueError:
+        raise HTTPException(HTTP_400_BAD_REQUEST, "Invalid cursor")
+
+
+# Markers FTS5 `snippet()` wraps matched words into
+SNIPPET_START = "\x02"
+SNIPPET_END = "\x03"
+
+
+def to_fts_query(search_query: str) -> str | None:
+    """Converts a search query to FTS5 `MATCH` expression.
+
+    Every word of the query is quoted (so users can't use FTS5 syntax)
+    and matched as a prefix. Returns `None` if query hasn't any words."""
+    words = re.findall(r"\w+", search_query)
+    if not words:
+        return None
+
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def highlight_snippet(snippet: str) -> str:
+    """Escapes a snippet made by FTS5 and wraps matches into `<mark>` tag."""
+    return str(escape(snippet)).replace(
+        SNIPPET_START, "<mark>"
+    ).replace(SNIPPET_END, "</mark>")
+
+
+def recipes_etag(recipes: list[Recipe | Row], *extra: Any) -> str:
+    """Returns an ETag of recipes list without rendering it.
+
+    It changes when a recipe in the list is replaced or updated,
+    `extra` is anything else the response depends on (e.g. paginator)."""
+    return make_etag(
+        [(recipe.id, recipe.updated_at) for recipe in recipes], *extra
+    )
+
+
+def parse_bulk_body(body: bytes, content_type: str) -> list:
+    """Parses a body of bulk request: JSON array or NDJSON."""
+    try:
+        if content_type.startswith("application/x-ndjson"):
+            return [
+                json.loads(line) for line in body.splitlines() if line.strip()
+            ]
+
+        items = json.loads(body)
+    except ValueError:
+        raise HTTPException(HTTP_400_BAD_REQUEST, "Invalid JSON")
+
+    if not isinstance(items, list):
+        raise HTTPException(
+            HTTP_400_BAD_REQUEST, "Expected a list of recipes"
+        )
+
+    return items
+
+
+def format_validation_errors(e: ValidationError) -> list[str]:
+    """Formats errors of pydantic validation as `field: message` strings."""
+    return [
+        ": ".join(filter(None, (
+            ".".join(map(str, error["loc"])), error["msg"]
+        ))) for error in e.errors()
+    ]
+
+
+def to_ndjson(row: dict[str, Any]) -> bytes:
+    """Serializes a row to NDJSON line, datetimes are in ISO format."""
+    return json.dumps(
+        row, ensure_ascii=False,
+        default=lambda value: value.isoformat()
+    ).encode() + b"\n"
@@ -0,0 +1,112 @@
+"""Key ring of secret keys that sign auth tokens.
+
+The first key signs new tokens, all keys verify them. Rotation puts
+a new key first and keeps a few previous ones, so tokens issued before
+it keep working until they expire. Workers load keys on start.
+
+Usage (from `src` folder):
+
+    python -m signing rotate
+    python -m signing rotate --keep 1
+"""
+import argparse
+import os
+from secrets import token_urlsafe
+from tempfile import mkstemp
+
+import jwt
+from fastapi_users.jwt import decode_jwt
+
+
+def read_secret_keys(path: str) -> list[str]:
+    """Reads keys from a file, one key per line."""
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def write_secret_keys(path: str, keys: list[str], replace: bool = True) -> bool:
+    """Writes keys to a file atomically, readable only by the owner.
+
+    If `replace` is false, an existing file is kept and `False`
+    is returned."""
+    fd, tmp = mkstemp(dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write("\n".join(keys) + "\n")
+
+        if replace:
+            os.replace(tmp, path)
+            return True
+
+        try:
+            os.link(tmp, path)
+        except FileExistsError:
+            return False
+
+        return True
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def load_secret_keys(keys: str, path: str) -> list[str]:
+    """Returns comma-separated `keys` or keys from a file.
+
+    If `keys` are empty and the file doesn't exist, it's created
+    with a new key."""
+    if keys:
+        return [key for key in keys.split(",") if key]
+
+    if not os.path.exists(path):
+        # Workers started at once all use the key written first
+        write_secret_keys(path, [token_urlsafe(32)], replace=False)
+
+    return read_secret_keys(path)
+
+
+def rotate_secret_keys(path: str, keep: int) -> list[str]:
+    """Puts a new key first and keeps `keep` previous keys."""
+    keys = read_secret_keys(path) if os.path.exists(path) else []
+    keys = [token_urlsafe(32)] + keys[:keep]
+    write_secret_keys(path, keys)
+
+    return keys
+
+
+def decode_token(
+    token: str, keys: list[str], audience: list[str],
+    algorithms: list[str] = ["HS256"]
+) -> dict:
+    """Decodes a JWT signed by any of the keys.
+
+    Raises `jwt.PyJWTError` if it's invalid or expired."""
+    for key in keys[:-1]:
+        try:
+            return decode_jwt(token, key, audience, algorithms)
+        except jwt.InvalidSignatureError:
+            pass
+
+    return decode_jwt(token, keys[-1], audience, algorithms)
+
+
+def main() -> None:
+    from config import SECRET_KEYS_FILE, SECRET_KEYS_KEEP
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("command", choices=("rotate",))
+    parser.add_argument("--file", default=SECRET_KEYS_FILE)
+    parser.add_argument(
+        "--keep", type=int, default=SECRET_KEYS_KEEP,
+        help="number of previous keys that still verify tokens"
+    )
+    args = parser.parse_args()
+
+    keys = rotate_secret_keys(args.file, args.keep)
+    print(
+        f"{args.file}: new signing key, {len(keys) - 1} previous kept. "
+        "Restart workers to use it."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import logging
+import re
+from collections import Counter
+
+from fastapi import Request, Response
+
+from config import (
+    SQL_TRACE_MAX_QUERIES, SQL_TRACE_MAX_DURATION, SQL_TRACE_REPEATS
+)
+
+logger = logging.getLogger("recipes.sql")
+
+# Lists of placeholders, e.g. of `IN (?, ?, ?)`
+PLACEHOLDERS = re.compile(r"\?(?:\s*,\s*\?)+")
+
+
+def statement_shape(statement: str) -> str:
+    """Returns a statement with normalized whitespace and lists of
+    placeholders collapsed, so `IN` of any size has the same shape."""
+    return PLACEHOLDERS.sub("?", " ".join(statement.split()))
+
+
+def find_repeated(
+    statements: list[tuple[str, float, int]], repeats: int = SQL_TRACE_REPEATS
+) -> dict[str, int]:
+    """Returns shapes of statements executed at least `repeats` times
+    with their counts, they're likely N+1 queries."""
+    counts = Counter(
+        statement_shape(statement) for statement, *_ in statements
+    )
+
+    return {shape: n for shape, n in counts.items() if n >= repeats}
+
+
+def trace_queries(
+    request: Request, response: Response,
+    statements: list[tuple[str, float, int]]
+) -> None:
+    """Adds `Server-Timing` header with a summary of SQL queries.
+
+    Logs queries of the request if it exceeds any of thresholds."""
+    duration = sum(duration for _, duration, _ in statements)
+    repeated = find_repeated(statements)
+
+    response.headers.append(
+        "Server-Timing",
+        f'db;dur={duration * 1000:.2f};desc="{len(statements)} queries"'
+    )
+    if repeated:
+        response.headers.append(
+            "Server-Timing",
+            f'db-repeated;desc="{sum(repeated.values())} repeated queries"'
+        )
+
+    if (
+        len(statements) <= SQL_TRACE_MAX_QUERIES
+        and duration <= SQL_TRACE_MAX_DURATION and not repeated
+    ):
+        return
+
+    lines = [
+        f"{request.method} {request.url.path}: {len(statements)} queries "
+        f"in {duration * 1000:.2f} ms"
+    ]
+    for shape, n in repeated.items():
+        lines.append(f"  repeated {n} times (N+1?): {shape}")
+    for statement, query_duration, rowcount in statements:
+        rows = f", {rowcount} rows" if rowcount >= 0 else ""
+        lines.append(
+            f"  {query_duration * 1000:.2f} ms{rows}: "
+            f"{statement_shape(statement)}"
+        )
+    logger.warning("\n".join(lines))
@@ -0,0 +1,73 @@
+import pytest
+
+from fastapi.testclient import TestClient
+
+from auth.utils import principal_cache, invalidate_principal
+from cache import LRUCache, MISSING
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_lru_cache_eviction() -> None:
+    """`LRUCache` evicts the least recently used value."""
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is MISSING
+    assert cache.stats()["hits"] == 2
+
+
+async def test_lru_cache_ttl() -> None:
+    """`LRUCache` doesn't return expired values."""
+    cache = LRUCache(maxsize=2, ttl=60)
+    cache.set("a", 1, ttl=-1)
+
+    assert cache.get("a") is MISSING
+    assert len(cache) == 0
+
+
+async def test_principal_cache_hit(authenticated_client: TestClient) -> None:
+    """Second request with the same token doesn't load a user."""
+    principal_cache.clear()
+    hits = principal_cache.hits
+
+    for _ in range(2):
+        authenticated_client.post("/api/recipes/", json={
+            "headling": "principal cache test",
+            "text": "lorem ipsum dolor!"
+        })
+
+    assert principal_cache.hits == hits + 1
+
+
+async def test_principal_cache_logout(
+    authenticated_client: TestClient
+) -> None:
+    """Logout removes a token from the cache."""
+    token = authenticated_client.cookies["fastapiusersauth"]
+    authenticated_client.post("/api/recipes/", json={
+        "headling": "principal cache test",
+        "text": "lorem ipsum dolor!"
+    })
+
+    authenticated_client.post("/auth/jwt/logout")
+
+    assert principal_cache.get(token) is MISSING
+
+
+async def test_invalidate_principal(authenticated_client: TestClient) -> None:
+    """`invalidate_principal` removes all tokens of the user."""
+    token = authenticated_client.cookies["fastapiusersauth"]
+    authenticated_client.post("/api/recipes/", json={
+        "headling": "principal cache test",
+        "text": "lorem ipsum dolor!"
+    })
+    principal = principal_cache.get(token)
+
+    invalidate_principal(principal.id)
+
+    assert principal_cache.get(token) is MISSING
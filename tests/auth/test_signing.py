@@ -0,0 +1,38 @@
+import jwt
+import pytest
+
+from fastapi_users.jwt import generate_jwt
+
+from signing import decode_token, load_secret_keys, rotate_secret_keys
+
+pytestmark = pytest.mark.asyncio
+
+AUDIENCE = ["fastapi-users:auth"]
+
+
+async def test_load_secret_keys(tmp_path) -> None:
+    """Keys file is created once and then read by every worker."""
+    path = str(tmp_path / "secret.keys")
+
+    keys = load_secret_keys("", path)
+
+    assert len(keys) == 1
+    assert load_secret_keys("", path) == keys
+    assert load_secret_keys("a,b", path) == ["a", "b"]
+
+
+async def test_rotate_secret_keys(tmp_path) -> None:
+    """Tokens signed by previous keys are valid until they're dropped."""
+    path = str(tmp_path / "secret.keys")
+    old_keys = load_secret_keys("", path)
+    token = generate_jwt({"sub": "1", "aud": AUDIENCE}, old_keys[0])
+
+    keys = rotate_secret_keys(path, keep=1)
+
+    assert keys[1:] == old_keys
+    assert decode_token(token, keys, AUDIENCE)["sub"] == "1"
+
+    keys = rotate_secret_keys(path, keep=1)
+
+    with pytest.raises(jwt.InvalidSignatureError):
+        decode_token(token, keys, AUDIENCE)
@@ -1,32 +1,48 @@
 import asyncio
+import pytest
 import pytest_asyncio
 
+from contextlib import contextmanager
+
+from fastapi import Request
 from fastapi.testclient import TestClient
 from httpx import AsyncClient
-from sqlalchemy.ext.asyncio import (
-    AsyncSession, create_async_engine, async_sessionmaker
-)
+from sqlalchemy import event, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.pool import NullPool
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Generator
 
-from src.database import get_async_session, Base
+from src.database import (
+    get_async_session, get_read_session, make_engine, Base, User
+)
 from src.main import app
+from auth.utils import principal_cache
+from config import limiter
 
 # Database
 DATABASE_URL_TEST = "sqlite+aiosqlite:///./database.db"
-engine_test = create_async_engine(DATABASE_URL_TEST, poolclass=NullPool)
+engine_test = make_engine(DATABASE_URL_TEST, poolclass=NullPool)
 async_session_maker = async_sessionmaker(
     engine_test, expire_on_commit=False
 )
 Base.metadata.bind = engine_test
 
 
-async def override_get_async_session() -> AsyncGenerator[AsyncSession, None]:
+async def override_get_async_session(
+    request: Request
+) -> AsyncGenerator[AsyncSession, None]:
+    async with async_session_maker(info={"request": request}) as session:
+        yield session
+
+
+async def override_get_read_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
         yield session
 
 
 app.dependency_overrides[get_async_session] = override_get_async_session
+app.dependency_overrides[get_read_session] = override_get_read_session
 
 
 async def prepare_database() -> None:
@@ -42,6 +58,27 @@ asyncio.run(prepare_database())
 client = TestClient(app)
 
 
+@pytest.fixture(autouse=True)
+def reset_limiter() -> None:
+    """Resets rate limits, so tests don't run out of them."""
+    limiter.reset()
+
+
+@contextmanager
+def count_queries() -> Generator[list[str], None, None]:
+    """Collects SQL statements executed by any engine inside the block."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args) -> None:
+        statements.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, "before_cursor_execute", before_cursor_execute)
+
+
 @pytest_asyncio.fixture(scope="session")
 async def ac() -> AsyncGenerator[AsyncClient, None]:
     async with AsyncClient(app=app, base_url="http://test") as ac:
@@ -80,6 +117,20 @@ async def authenticated_client() -> None:
     authenticated_client.cookies = None
 
 
+async def set_superuser(username: str, is_superuser: bool) -> None:
+    """Grants or revokes superuser rights of a user.
+
+    Cached principals are dropped, so the next request sees the change."""
+    async with async_session_maker() as session:
+        await session.execute(
+            update(User).where(User.username == username).values(
+                is_superuser=is_superuser
+            )
+        )
+        await session.commit()
+    principal_cache.clear()
+
+
 async def create_recipe_for_update(client: TestClient) -> dict:
     recipe = client.post("/api/recipes/", json={
         "headling": "test recipes api not updated",
@@ -0,0 +1,43 @@
+import io
+
+import pytest
+
+from fastapi.testclient import TestClient
+
+from recipes.cli import TABLES, export_rows, import_rows, read_rows
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_import_export_recipes(
+    authenticated_client: TestClient
+) -> None:
+    """Imports recipes from CSV and finds them in NDJSON export."""
+    users = io.StringIO()
+    await export_rows(TABLES["users"], users, "csv")
+    users.seek(0)
+    author_id = next(
+        user["id"] for user in read_rows(users, "csv")
+        if user["username"] == "test_user"
+    )
+    file = io.StringIO(
+        "headling,text,author_id,pub_date\n"
+        + "".join(
+            f"cli import test {i},lorem ipsum dolor!,{author_id},"
+            "2023-01-01T00:00:00\n"
+            for i in range(5)
+        )
+    )
+
+    done = await import_rows(
+        TABLES["recipes"], read_rows(file, "csv"), batch_size=2, skip=1
+    )
+
+    output = io.StringIO()
+    await export_rows(TABLES["recipes"], output, "ndjson")
+    output.seek(0)
+    exported = [row["headling"] for row in read_rows(output, "ndjson")]
+
+    assert done == 4
+    assert "cli import test 0" not in exported
+    assert "cli import test 4" in exported
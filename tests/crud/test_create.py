@@ -2,7 +2,8 @@ import pytest
 
 from fastapi.testclient import TestClient
 from starlette.status import (
-    HTTP_201_CREATED, HTTP_422_UNPROCESSABLE_ENTITY, HTTP_401_UNAUTHORIZED
+    HTTP_200_OK, HTTP_201_CREATED, HTTP_400_BAD_REQUEST,
+    HTTP_422_UNPROCESSABLE_ENTITY, HTTP_401_UNAUTHORIZED
 )
 
 from conftest import client
@@ -83,4 +84,56 @@ async def test_unauth_create_recipe() -> None:
         "text": "lorem ipsum dolor!"
     })
 
-    assert r.status_code == HTTP_401_UNAUTHORIZED
\ No newline at end of file
+    assert r.status_code == HTTP_401_UNAUTHORIZED
+
+
+async def test_create_recipes(authenticated_client: TestClient) -> None:
+    """`create_recipes` endpoint standard test."""
+    r = authenticated_client.post("/api/recipes/bulk", json=[
+        {"headling": "recipes bulk api test 1", "text": "lorem ipsum dolor!"},
+        {"headling": "123", "text": "lorem ipsum dolor!"},
+        {"headling": "recipes bulk api test 2", "text": "lorem ipsum dolor!"},
+    ])
+    results = r.json()
+
+    assert r.status_code == HTTP_200_OK
+    assert results[0]["id"] and results[2]["id"]
+    assert results[0]["id"] != results[2]["id"]
+    assert results[1]["errors"] and not results[1]["id"]
+
+
+async def test_create_recipes_ndjson(
+    authenticated_client: TestClient
+) -> None:
+    """`create_recipes` endpoint test with NDJSON body."""
+    r = authenticated_client.post(
+        "/api/recipes/bulk",
+        content=(
+            '{"headling": "recipes bulk ndjson test", "text": "lorem ipsum"}\n'
+            '{"headling": "recipes bulk ndjson test", "text": "lorem ipsum"}\n'
+        ),
+        headers={"Content-Type": "application/x-ndjson"}
+    )
+
+    assert all(result["id"] for result in r.json())
+
+
+async def test_create_recipes_invalid_json(
+    authenticated_client: TestClient
+) -> None:
+    """`create_recipes` endpoint test with invalid body."""
+    r = authenticated_client.post(
+        "/api/recipes/bulk", content="not json",
+        headers={"Content-Type": "application/json"}
+    )
+
+    assert r.status_code == HTTP_400_BAD_REQUEST
+
+
+async def test_unauth_create_recipes() -> None:
+    """`create_recipes` endpoint test without authentication."""
+    r = client.post("/api/recipes/bulk", json=[
+        {"headling": "recipes bulk api test", "text": "lorem ipsum dolor!"}
+    ])
+
+    assert r.status_code == HTTP_401_UNAUTHORIZED
@@ -0,0 +1,52 @@
+from pathlib import Path
+
+import pytest
+
+from sqlalchemy import func, select, text
+from sqlalchemy.pool import NullPool
+
+from database import Base, User, make_engine, recipe_stats
+from recipes.generate import generate
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_generate(tmp_path: Path) -> None:
+    """Generated recipes are counted in stats and found by search.
+
+    Generated into a separate database, so they don't get into results
+    of other tests."""
+    engine = make_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'generated.db'}", poolclass=NullPool
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    try:
+        users, recipes = await generate(
+            3, 50, seed=1, engine=engine, prefix="generated_user_",
+            batch_size=20
+        )
+
+        async with engine.connect() as conn:
+            recipe_count = await conn.scalar(
+                select(recipe_stats.c.recipe_count)
+            )
+            generated_users = await conn.scalar(
+                select(func.count()).select_from(User)
+            )
+            found = await conn.scalar(text(
+                "SELECT count(*) FROM recipe_fts "
+                "WHERE recipe_fts MATCH 'tomato'"
+            ))
+            triggers = set(await conn.scalars(text(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+            )))
+    finally:
+        await engine.dispose()
+
+    assert (users, recipes) == (3, 50)
+    assert generated_users == 3
+    assert recipe_count == 50
+    assert found > 0
+    assert {"recipe_fts_insert", "recipe_stats_insert"} <= triggers
@@ -1,9 +1,15 @@
+import json
+
 import pytest
 
 from fastapi.testclient import TestClient
-from starlette.status import HTTP_404_NOT_FOUND
+from starlette.status import (
+    HTTP_200_OK, HTTP_304_NOT_MODIFIED, HTTP_400_BAD_REQUEST,
+    HTTP_404_NOT_FOUND
+)
 
-from conftest import client
+from conftest import async_session_maker, client
+from recipes.sampling import RecipeIdPool
 
 pytestmark = pytest.mark.asyncio
 
@@ -22,6 +28,22 @@ async def test_get_recipes(authenticated_client: TestClient) -> None:
     assert headling in r.json()[0].values()
 
 
+async def test_get_recipes_excerpt(authenticated_client: TestClient) -> None:
+    """Lists have an excerpt of recipe text, a recipe by id has full text."""
+    text = "lorem ipsum dolor! " * 20
+    recipe = authenticated_client.post("/api/recipes/", json={
+        "headling": "recipes api excerpt test", "text": text
+    }).json()
+
+    r = authenticated_client.get("/api/recipes/")
+
+    assert r.json()[0]["text"] == f"{text[:110]}..."
+
+    r = authenticated_client.get("/api/recipes/", params={"id": recipe["id"]})
+
+    assert r.json()["text"] == text
+
+
 async def test_search_recipes(authenticated_client: TestClient) -> None:
     """`get_recipes` endpoint search test."""
     recipe = authenticated_client.post("/api/recipes/", json={
@@ -91,3 +113,183 @@ async def test_get_recipes_few_params(
     })
 
     assert headling in r.json()[0]["headling"]
+
+
+async def test_get_recipes_cursor(authenticated_client: TestClient) -> None:
+    """`get_recipes` endpoint test with cursor of the next page."""
+    for i in range(2):
+        authenticated_client.post("/api/recipes/", json={
+            "headling": f"recipes api cursor test {i}",
+            "text": "lorem ipsum dolor!"
+        })
+
+    first_page = authenticated_client.get(
+        "/api/recipes/", params={"size": 1}
+    ).json()
+    cursor = first_page[-1]["next_cursor"]
+
+    second_page = authenticated_client.get(
+        "/api/recipes/", params={"size": 1, "cursor": cursor}
+    ).json()
+
+    assert first_page[0]["headling"] == "recipes api cursor test 1"
+    assert second_page[0]["headling"] == "recipes api cursor test 0"
+
+
+async def test_get_recipes_invalid_cursor() -> None:
+    """`get_recipes` endpoint test with malformed cursor."""
+    r = client.get("/api/recipes/", params={"cursor": "not a cursor"})
+
+    assert r.json()["detail"]
+    assert r.status_code == HTTP_400_BAD_REQUEST
+
+
+async def test_search_recipes_by_text(
+    authenticated_client: TestClient
+) -> None:
+    """`get_recipes` endpoint search test with a word from recipe text."""
+    authenticated_client.post("/api/recipes/", json={
+        "headling": "recipes api full-text search test",
+        "text": "lorem ipsum dolor with <b>tamarindglazed</b> tofu!"
+    })
+
+    r = authenticated_client.get(
+        "/api/recipes/", params={"search_query": "tamarindglaze"}
+    )
+    snippet = next(
+        recipe["snippet"] for recipe in r.json()
+        if recipe.get("headling") == "recipes api full-text search test"
+    )
+
+    assert "<mark>tamarindglazed</mark>" in snippet
+    assert "&lt;b&gt;" in snippet
+
+
+async def test_get_few_random_recipes(
+    authenticated_client: TestClient
+) -> None:
+    """`get_random_recipes` endpoint test with few recipes."""
+    for i in range(2):
+        authenticated_client.post("/api/recipes/", json={
+            "headling": f"recipes api random test {i}",
+            "text": "lorem ipsum dolor!"
+        })
+
+    r = authenticated_client.get("/api/recipes/random", params={"n": 2})
+    ids = [recipe["id"] for recipe in r.json()]
+
+    assert len(ids) == 2
+    assert len(set(ids)) == 2
+
+
+async def test_recipe_id_pool_reload(
+    authenticated_client: TestClient
+) -> None:
+    """Expired pool of random recipe ids is reloaded in background,
+    samples are taken from the old ids meanwhile."""
+    pool = RecipeIdPool(ttl=0)
+    async with async_session_maker() as session:
+        await pool.load(session)
+        recipe = authenticated_client.post("/api/recipes/", json={
+            "headling": "recipes api id pool test",
+            "text": "lorem ipsum dolor!"
+        }).json()
+
+        old_ids = await pool.sample(session, 10 ** 6)
+        # Written by this process during the reload
+        pool.add(10 ** 9)
+        await pool._reload
+        new_ids = await pool.sample(session, 10 ** 6)
+        await pool._reload
+
+    assert recipe["id"] not in old_ids
+    assert recipe["id"] in new_ids
+    assert 10 ** 9 in new_ids
+
+
+async def test_get_author_recipes(authenticated_client: TestClient) -> None:
+    """`get_recipes` endpoint test with author."""
+    authenticated_client.post("/api/recipes/", json={
+        "headling": "recipes api author test",
+        "text": "lorem ipsum dolor!"
+    })
+
+    r = authenticated_client.get(
+        "/api/recipes/", params={"author": "test_user"}
+    )
+    nonexistent_author = client.get(
+        "/api/recipes/", params={"author": "nonexistent_user"}
+    )
+
+    assert all(recipe["author"] == "test_user" for recipe in r.json()[:-1])
+    assert nonexistent_author.status_code == HTTP_404_NOT_FOUND
+
+
+async def test_get_recipes_not_modified(
+    authenticated_client: TestClient
+) -> None:
+    """`get_recipes` endpoint test with `If-None-Match`."""
+    authenticated_client.post("/api/recipes/", json={
+        "headling": "recipes api etag test",
+        "text": "lorem ipsum dolor!"
+    })
+    etag = client.get("/api/recipes/").headers["ETag"]
+
+    r = client.get("/api/recipes/", headers={"If-None-Match": etag})
+
+    assert r.status_code == HTTP_304_NOT_MODIFIED
+    assert not r.content
+
+
+async def test_get_recipes_modified(authenticated_client: TestClient) -> None:
+    """`get_recipes` endpoint test with `If-None-Match` after a change."""
+    recipe = authenticated_client.post("/api/recipes/", json={
+        "headling": "recipes api etag test",
+        "text": "lorem ipsum dolor!"
+    }).json()
+    etag = client.get(
+        "/api/recipes/", params={"id": recipe["id"]}
+    ).headers["ETag"]
+
+    authenticated_client.put(
+        "/api/recipes/", params={"id": recipe["id"]}, json={
+            "headling": "recipes api etag test updated",
+            "text": "lorem ipsum dolor!"
+        }
+    )
+    r = client.get(
+        "/api/recipes/", params={"id": recipe["id"]},
+        headers={"If-None-Match": etag}
+    )
+
+    assert r.status_code == HTTP_200_OK
+    assert r.headers["ETag"] != etag
+    assert r.headers["Last-Modified"]
+
+
+async def test_export_recipes(authenticated_client: TestClient) -> None:
+    """`export_recipes` endpoint standard test."""
+    recipe = authenticated_client.post("/api/recipes/", json={
+        "headling": "recipes api export test",
+        "text": "lorem ipsum dolor!"
+    }).json()
+
+    r = client.get("/api/recipes/export", params={"compress": True})
+    recipes = [json.loads(line) for line in r.text.splitlines()]
+
+    assert r.headers["Content-Encoding"] == "gzip"
+    assert recipe["id"] in [recipe["id"] for recipe in recipes]
+
+
+async def test_export_recipes_since_id(
+    authenticated_client: TestClient
+) -> None:
+    """`export_recipes` endpoint test with `since_id`."""
+    recipe = authenticated_client.post("/api/recipes/", json={
+        "headling": "recipes api export test",
+        "text": "lorem ipsum dolor!"
+    }).json()
+
+    r = client.get("/api/recipes/export", params={"since_id": recipe["id"]})
+
+    assert r.text == ""
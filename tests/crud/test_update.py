@@ -33,6 +33,25 @@ async def test_update_recipe(authenticated_client: TestClient) -> None:
     assert "lorem ipsum dolor now updated!!" == r.json()["text"]
 
 
+async def test_update_recipe_updated_at(
+    authenticated_client: TestClient
+) -> None:
+    """`update_recipe` endpoint responds with the new `updated_at`."""
+    recipe = await create_recipe_for_update(authenticated_client)
+
+    updated = authenticated_client.put(
+        "/api/recipes/", params={"id": recipe["id"]},
+        json=updated_recipe_dict
+    ).json()
+
+    r = authenticated_client.get(
+        "/api/recipes/", params={"id": recipe["id"]}
+    )
+
+    assert updated["updated_at"] != recipe["updated_at"]
+    assert updated["updated_at"] == r.json()["updated_at"]
+
+
 async def test_update_recipe_short_headling(
     authenticated_client: TestClient
 ) -> None:
@@ -0,0 +1,74 @@
+import pytest
+
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select, text
+
+from conftest import (
+    app, async_session_maker, client, create_and_authenticate, engine_test
+)
+from database import READ_PRIMARY_COOKIE, Recipe, User, recipe_stats
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_sqlite_pragmas() -> None:
+    """SQLite connections are opened in WAL mode with tuned pragmas."""
+    async with engine_test.connect() as conn:
+        journal_mode = await conn.scalar(text("PRAGMA journal_mode"))
+        synchronous = await conn.scalar(text("PRAGMA synchronous"))
+        busy_timeout = await conn.scalar(text("PRAGMA busy_timeout"))
+        temp_store = await conn.scalar(text("PRAGMA temp_store"))
+        foreign_keys = await conn.scalar(text("PRAGMA foreign_keys"))
+
+    assert journal_mode == "wal"
+    # NORMAL
+    assert synchronous == 1
+    assert busy_timeout == 5000
+    # MEMORY
+    assert temp_store == 2
+    assert foreign_keys == 1
+
+
+async def test_delete_user_recipes() -> None:
+    """Recipes of a deleted user are deleted with them."""
+    user_client = TestClient(app)
+    await create_and_authenticate(
+        user_client, username="deleted_user", email="deleted@example.com"
+    )
+    user_client.post("/api/recipes/", json={
+        "headling": "deleted user recipe",
+        "text": "lorem ipsum dolor!"
+    })
+
+    async with async_session_maker() as session:
+        user = await session.scalar(
+            select(User).where(User.username == "deleted_user")
+        )
+        await session.delete(user)
+        await session.commit()
+
+        recipes = await session.scalar(
+            select(func.count()).select_from(Recipe).where(
+                Recipe.author_id == user.id
+            )
+        )
+        recipe_count = await session.scalar(
+            select(recipe_stats.c.recipe_count)
+        )
+        total = await session.scalar(select(func.count()).select_from(Recipe))
+
+    assert recipes == 0
+    assert recipe_count == total
+
+
+async def test_read_your_writes(authenticated_client: TestClient) -> None:
+    """Client reads from the primary for a while after a write."""
+    r = client.get("/api/recipes/")
+    assert READ_PRIMARY_COOKIE not in r.cookies
+
+    r = authenticated_client.post("/api/recipes/", json={
+        "headling": "read your writes test",
+        "text": "lorem ipsum dolor!"
+    })
+
+    assert r.cookies.get(READ_PRIMARY_COOKIE) == "1"
@@ -0,0 +1,74 @@
+import pytest
+
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from conftest import client, count_queries, engine_test
+
+pytestmark = pytest.mark.asyncio
+
+
+async def create_recipe(client: TestClient) -> dict:
+    return client.post("/api/recipes/", json={
+        "headling": "query count test recipe",
+        "text": "lorem ipsum dolor!"
+    }).json()
+
+
+async def test_recipes_list_queries(authenticated_client: TestClient) -> None:
+    """Latest recipes list is one query with joined authors and a read
+    of the maintained count."""
+    # One more than a page, so the list has a next page
+    for _ in range(3):
+        await create_recipe(authenticated_client)
+
+    with count_queries() as statements:
+        client.get("/api/recipes/", params={"size": 2})
+
+    assert len(statements) == 2
+
+    with count_queries() as statements:
+        r = client.get("/api/recipes/", params={"size": 2, "count": False})
+
+    assert r.json()[-1]["total"] is None
+    assert r.json()[-1]["has_next"]
+    assert len(statements) == 1
+
+
+async def test_recipe_by_id_queries(authenticated_client: TestClient) -> None:
+    """Recipe by id is loaded with its author in one query."""
+    recipe = await create_recipe(authenticated_client)
+
+    with count_queries() as statements:
+        r = client.get("/api/recipes/", params={"id": recipe["id"]})
+
+    assert r.json()["author"] == recipe["author"]
+    assert len(statements) == 1
+
+
+async def test_recipe_page_queries(authenticated_client: TestClient) -> None:
+    """Recipe page loads the recipe and uncounted latest recipes."""
+    recipe = await create_recipe(authenticated_client)
+
+    with count_queries() as statements:
+        r = client.get(f"/recipe/{recipe['id']}/")
+
+    assert r.status_code == 200
+    assert len(statements) == 2
+
+
+async def test_recipe_stats(authenticated_client: TestClient) -> None:
+    """Maintained number of recipes follows creation and deletion."""
+    recipe = await create_recipe(authenticated_client)
+    authenticated_client.delete("/api/recipes/", params={"id": recipe["id"]})
+    authenticated_client.post("/api/recipes/bulk", json=[
+        {"headling": "query count bulk recipe", "text": "lorem ipsum dolor!"}
+    ] * 3)
+
+    async with engine_test.connect() as conn:
+        recipe_count = await conn.scalar(
+            text("SELECT recipe_count FROM recipe_stats")
+        )
+        total = await conn.scalar(text("SELECT count(*) FROM recipe"))
+
+    assert recipe_count == total
@@ -0,0 +1,67 @@
+from datetime import datetime
+
+import pytest
+
+from sqlalchemy import Select, event, select
+
+from conftest import engine_test
+from database import Recipe, User
+from recipes.router import _page_query
+from recipes.utils import encode_cursor, select_recipe_list
+
+pytestmark = pytest.mark.asyncio
+
+
+async def query_plan(stmt: Select) -> str:
+    """Returns `EXPLAIN QUERY PLAN` of the statement as one string.
+
+    The statement is compiled and bound as the app runs it, only
+    `EXPLAIN QUERY PLAN` is put before it."""
+    def explain(conn, cursor, statement, parameters, context, executemany):
+        return f"EXPLAIN QUERY PLAN {statement}", parameters
+
+    async with engine_test.connect() as conn:
+        event.listen(
+            conn.sync_connection, "before_cursor_execute", explain,
+            retval=True
+        )
+        result = await conn.execute(stmt)
+
+        # Rows are (id, parent, notused, detail)
+        return " ".join(row[3] for row in result)
+
+
+async def test_latest_recipes_plan() -> None:
+    """Latest recipes are read from the index without sorting."""
+    plan = await query_plan(_page_query(select_recipe_list()))
+
+    assert "USING INDEX ix_recipe_pub_date_id" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+async def test_latest_recipes_cursor_plan() -> None:
+    """Page after a cursor is searched in the index."""
+    cursor = encode_cursor(datetime(2026, 1, 1), 100)
+    plan = await query_plan(_page_query(select_recipe_list(), cursor=cursor))
+
+    assert "USING INDEX ix_recipe_pub_date_id" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+async def test_author_recipes_plan() -> None:
+    """Recipes of an author are read from the index without sorting."""
+    plan = await query_plan(_page_query(
+        select_recipe_list().where(User.username == "test_user")
+    ))
+
+    assert "USING INDEX ix_recipe_author_id_pub_date" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+async def test_recipe_by_id_plan() -> None:
+    """Recipe by id is found by primary key."""
+    plan = await query_plan(
+        select(Recipe).join(Recipe.author).where(Recipe.id == 1)
+    )
+
+    assert "USING INTEGER PRIMARY KEY" in plan
@@ -0,0 +1,47 @@
+import pytest
+
+from fastapi.testclient import TestClient
+
+import memory
+from conftest import client, set_superuser
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_memory_forbidden(authenticated_client: TestClient) -> None:
+    """Memory stats are available only to superusers."""
+    assert client.get("/debug/memory/").status_code == 401
+    assert authenticated_client.get("/debug/memory/").status_code == 403
+
+
+async def test_memory_snapshots(authenticated_client: TestClient) -> None:
+    """Superuser compares snapshots and counts live recipes."""
+    await set_superuser("test_user", True)
+    try:
+        r = authenticated_client.post("/debug/memory/start?frames=5")
+        assert r.status_code == 200
+        authenticated_client.post("/debug/memory/snapshots/before")
+
+        authenticated_client.get("/api/recipes/")
+        r = authenticated_client.get(
+            "/debug/memory/snapshots/current?compare_to=before"
+            "&key_type=traceback&limit=5"
+        )
+        assert r.status_code == 200
+        assert len(r.json()) <= 5
+        assert "size_diff" in r.json()[0]
+
+        r = authenticated_client.get("/debug/memory/?match=Recipe&collect=1")
+        stats = r.json()
+        assert stats["tracing"]
+        assert stats["snapshots"] == ["before"]
+        assert all("Recipe" in name for name in stats["types"])
+        assert len(stats["gc"]["generations"]) == 3
+
+        authenticated_client.post("/debug/memory/stop")
+        r = authenticated_client.get("/debug/memory/snapshots/before")
+        assert r.status_code == 404
+        assert memory.snapshots == {}
+    finally:
+        authenticated_client.post("/debug/memory/stop")
+        await set_superuser("test_user", False)
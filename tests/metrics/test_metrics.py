@@ -0,0 +1,31 @@
+import pytest
+
+from fastapi.testclient import TestClient
+
+from conftest import client
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_metrics(authenticated_client: TestClient) -> None:
+    """Requests and their SQL queries are recorded by route."""
+    recipe = authenticated_client.post("/api/recipes/", json={
+        "headling": "metrics test recipe",
+        "text": "lorem ipsum dolor!"
+    }).json()
+    client.get("/api/recipes/", params={"id": recipe["id"]})
+
+    r = client.get("/metrics")
+    metrics = r.text
+
+    assert r.headers["content-type"].startswith("text/plain")
+    assert (
+        'http_requests_total{method="GET",route="/api/recipes/",status="200"}'
+        in metrics
+    )
+    assert (
+        'http_request_duration_seconds_bucket{method="GET",'
+        'route="/api/recipes/",le="+Inf"}' in metrics
+    )
+    assert 'db_query_duration_seconds_count{route="/api/recipes/"}' in metrics
+    assert 'cache_hits_total{cache="page"}' in metrics
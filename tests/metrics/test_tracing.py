@@ -0,0 +1,36 @@
+import pytest
+
+import metrics
+from conftest import client
+from tracing import find_repeated, statement_shape
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_statement_shape() -> None:
+    """Statements differing only in size of `IN` lists have one shape."""
+    assert statement_shape(
+        "SELECT id\n  FROM recipe WHERE id IN (?, ?, ?)"
+    ) == statement_shape("SELECT id FROM recipe WHERE id IN (?)")
+
+
+async def test_find_repeated() -> None:
+    """Statements repeated many times are reported as N+1."""
+    statements = [("SELECT * FROM recipes_user WHERE id = ?", 0.001, -1)] * 3
+    statements.append(("SELECT count(*) FROM recipe", 0.001, -1))
+
+    assert find_repeated(statements, repeats=3) == {
+        "SELECT * FROM recipes_user WHERE id = ?": 3
+    }
+
+
+async def test_server_timing(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Traced responses have a summary of SQL queries in `Server-Timing`."""
+    r = client.get("/api/recipes/")
+    assert "Server-Timing" not in r.headers
+
+    monkeypatch.setattr(metrics, "SQL_TRACE", True)
+    r = client.get("/api/recipes/")
+
+    assert 'db;dur=' in r.headers["Server-Timing"]
+    assert '2 queries' in r.headers["Server-Timing"]
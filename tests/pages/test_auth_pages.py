@@ -0,0 +1,71 @@
+import pytest
+
+from fastapi.testclient import TestClient
+from starlette.status import HTTP_200_OK, HTTP_302_FOUND
+
+from conftest import app
+
+pytestmark = pytest.mark.asyncio
+
+
+def register(client: TestClient, username: str, email: str, password: str):
+    return client.post("/register/", data={
+        "username": username, "email": email,
+        "password": password, "password1": password,
+    }, follow_redirects=False)
+
+
+async def test_register_page() -> None:
+    """Registration logs the user in with the auth cookie."""
+    client = TestClient(app)
+
+    r = register(client, "register_page_user", "register@gmail.com", "test1234")
+
+    assert r.status_code == HTTP_302_FOUND
+    assert r.cookies.get("fastapiusersauth")
+
+
+async def test_register_page_user_exists() -> None:
+    """Registration of an existing user shows an error."""
+    register(
+        TestClient(app), "existing_page_user", "existing@gmail.com", "test1234"
+    )
+    client = TestClient(app)
+
+    r = register(client, "existing_page_user", "existing@gmail.com", "test1234")
+
+    assert r.status_code == HTTP_200_OK
+    assert "User already exists" in r.text
+    assert "fastapiusersauth" not in r.cookies
+
+
+async def test_register_page_invalid_password() -> None:
+    """Registration with too short password shows an error."""
+    client = TestClient(app)
+
+    r = register(client, "short_password_user", "short@gmail.com", "test")
+
+    assert r.status_code == HTTP_200_OK
+    assert "Password is too short" in r.text
+    assert "fastapiusersauth" not in r.cookies
+
+
+async def test_login_page() -> None:
+    """Login sets the auth cookie, bad credentials show an error."""
+    register(TestClient(app), "login_page_user", "login@gmail.com", "test1234")
+    client = TestClient(app)
+
+    r = client.post("/login/", data={
+        "email": "login@gmail.com", "password": "wrong1234"
+    }, follow_redirects=False)
+
+    assert r.status_code == HTTP_200_OK
+    assert "Invalid credentials" in r.text
+    assert "fastapiusersauth" not in r.cookies
+
+    r = client.post("/login/", data={
+        "email": "login@gmail.com", "password": "test1234"
+    }, follow_redirects=False)
+
+    assert r.status_code == HTTP_302_FOUND
+    assert r.cookies.get("fastapiusersauth")
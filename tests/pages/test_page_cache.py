@@ -0,0 +1,82 @@
+import pytest
+
+from fastapi import Request
+from fastapi.responses import HTMLResponse
+from fastapi.testclient import TestClient
+
+from cache import recipes_version
+from conftest import client
+from pages.cache import cache_page, get_cached_page
+
+pytestmark = pytest.mark.asyncio
+
+
+def make_request(path: str, query_string: bytes = b"") -> Request:
+    return Request({
+        "type": "http", "method": "GET", "scheme": "http",
+        "server": ("test", 80), "path": path, "root_path": "",
+        "query_string": query_string, "headers": [],
+    })
+
+
+async def test_cache_anonymous_page() -> None:
+    """Page rendered for anonymous user is returned from the cache."""
+    request = make_request("/cache-test/", b"page=2")
+    cache_page(request, None, HTMLResponse("cached page"))
+
+    cached = get_cached_page(make_request("/cache-test/", b"page=2"), None)
+
+    assert cached.body == b"cached page"
+    assert cached.headers["X-Cache"] == "HIT"
+    assert get_cached_page(make_request("/cache-test/"), None) is None
+
+
+async def test_cached_page_not_modified(
+    authenticated_client: TestClient
+) -> None:
+    """Cached page answers `If-Modified-Since` like the uncached one."""
+    recipe = authenticated_client.post("/api/recipes/", json={
+        "headling": "page cache not modified test",
+        "text": "lorem ipsum dolor!"
+    }).json()
+    url = f"/recipe/{recipe['id']}/"
+    last_modified = client.get(url).headers["Last-Modified"]
+
+    r = client.get(url, headers={"If-Modified-Since": last_modified})
+
+    assert r.headers["X-Cache"] == "HIT"
+    assert r.status_code == 304
+
+
+async def test_cache_invalidation(authenticated_client: TestClient) -> None:
+    """Creating a recipe makes cached pages stale."""
+    request = make_request("/cache-invalidation-test/")
+    cache_page(request, None, HTMLResponse("stale page"))
+
+    authenticated_client.post("/api/recipes/", json={
+        "headling": "page cache invalidation test",
+        "text": "lorem ipsum dolor!"
+    })
+
+    assert get_cached_page(request, None) is None
+
+
+async def test_version_bumped_on_write(
+    authenticated_client: TestClient
+) -> None:
+    """Create, update and delete bump the content version."""
+    version = recipes_version.value
+
+    recipe = authenticated_client.post("/api/recipes/", json={
+        "headling": "page cache version test",
+        "text": "lorem ipsum dolor!"
+    }).json()
+    authenticated_client.put(
+        "/api/recipes/", params={"id": recipe["id"]}, json={
+            "headling": "page cache version test updated",
+            "text": "lorem ipsum dolor!"
+        }
+    )
+    authenticated_client.delete("/api/recipes/", params={"id": recipe["id"]})
+
+    assert recipes_version.value == version + 3
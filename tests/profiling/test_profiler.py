@@ -0,0 +1,83 @@
+import threading
+from time import perf_counter
+
+import pytest
+
+from fastapi.testclient import TestClient
+
+import profiling
+from conftest import client, set_superuser
+from profiling import ProfileWindow, Sampler
+
+pytestmark = pytest.mark.asyncio
+
+
+def busy_loop(seconds: float) -> None:
+    started_at = perf_counter()
+    while perf_counter() - started_at < seconds:
+        pass
+
+
+async def test_sampler() -> None:
+    """Sampler counts stacks of the profiled thread."""
+    sampler = Sampler(threading.get_ident(), interval=0.001)
+    sampler.start()
+    busy_loop(0.2)
+    sampler.stop()
+
+    assert sum(sampler.stacks.values()) > 0
+    assert any("busy_loop" in stack for stack in sampler.stacks)
+
+
+async def test_profile_superuser(
+    authenticated_client: TestClient, monkeypatch: pytest.MonkeyPatch,
+    tmp_path
+) -> None:
+    """Only superusers get profiles of their requests."""
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+
+    r = authenticated_client.get("/api/recipes/?__profile=1")
+    assert "X-Profile" not in r.headers
+
+    await set_superuser("test_user", True)
+    try:
+        r = authenticated_client.get(
+            "/api/recipes/", headers={"X-Profile": "1"}
+        )
+        profile = authenticated_client.get(r.headers["X-Profile"])
+        names = authenticated_client.get("/debug/profiles/").json()
+        missing = authenticated_client.get(
+            "/debug/profiles/..%2Fdatabase.db"
+        )
+    finally:
+        await set_superuser("test_user", False)
+
+    assert r.status_code == 200
+    assert r.headers["X-Profile"].startswith("/debug/profiles/")
+    assert profile.status_code == 200
+    assert profile.text == (
+        tmp_path / r.headers["X-Profile"].rsplit("/", 1)[-1]
+    ).read_text()
+    assert names == [r.headers["X-Profile"].rsplit("/", 1)[-1]]
+    assert missing.status_code == 404
+
+
+async def test_profiles_forbidden(authenticated_client: TestClient) -> None:
+    """Profiles are available only to superusers."""
+    assert client.get("/debug/profiles/").status_code == 401
+    assert authenticated_client.get("/debug/profiles/").status_code == 403
+
+
+async def test_sampled_requests(
+    monkeypatch: pytest.MonkeyPatch, tmp_path
+) -> None:
+    """Sampled requests are aggregated into a profile of a time window."""
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 1)
+    monkeypatch.setattr(profiling, "profile_window", ProfileWindow(0))
+
+    r = client.get("/api/recipes/")
+
+    assert r.status_code == 200
+    assert "X-Profile" not in r.headers
+    assert [path.name for path in tmp_path.glob("window-*-1-requests.*")]
@@ -0,0 +1,56 @@
+import pytest
+
+from fastapi import Request
+from fastapi.testclient import TestClient
+from starlette.status import HTTP_429_TOO_MANY_REQUESTS
+
+from config import SECRET_KEYS
+from conftest import client
+from ratelimit import SQLiteStorage, rejected_requests, user_or_ip_key
+
+pytestmark = pytest.mark.asyncio
+
+
+def make_request(cookie: str = "") -> Request:
+    return Request({
+        "type": "http", "method": "GET", "path": "/", "query_string": b"",
+        "headers": [(b"cookie", cookie.encode())],
+        "client": ("127.0.0.1", 1234),
+    })
+
+
+async def test_sqlite_storage() -> None:
+    """Counters of `SQLiteStorage` grow inside a window and expire."""
+    storage = SQLiteStorage("sqlite:///:memory:")
+
+    assert storage.incr("key", 60) == 1
+    assert storage.incr("key", 60) == 2
+    assert storage.get("key") == 2
+
+    assert storage.incr("expired", -1) == 1
+    assert storage.get("expired") == 0
+    assert storage.incr("expired", 60) == 1
+
+
+async def test_user_key(authenticated_client: TestClient) -> None:
+    """Authenticated users are limited by id, others by IP address."""
+    token = authenticated_client.cookies.get("fastapiusersauth")
+
+    assert user_or_ip_key(make_request(), SECRET_KEYS) == "127.0.0.1"
+    assert user_or_ip_key(
+        make_request(f"fastapiusersauth={token}"), SECRET_KEYS
+    ).startswith("user:")
+    assert user_or_ip_key(
+        make_request("fastapiusersauth=invalid"), SECRET_KEYS
+    ) == "127.0.0.1"
+
+
+async def test_rejected_requests() -> None:
+    """Rejected requests are counted by route."""
+    rejected = rejected_requests["/api/recipes/export"]
+
+    for _ in range(6):
+        r = client.get("/api/recipes/export")
+
+    assert r.status_code == HTTP_429_TOO_MANY_REQUESTS
+    assert rejected_requests["/api/recipes/export"] == rejected + 1